@@ -0,0 +1 @@
+"""Count-based HMM tagger used by the Task scripts."""
@@ -0,0 +1,5 @@
+import sys
+
+from hmm_tagger.cli import main
+
+sys.exit(main())
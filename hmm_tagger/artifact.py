@@ -0,0 +1,145 @@
+"""Binary model artifact: a JSON header followed by raw, aligned arrays.
+
+Layout::
+
+    MAGIC | header length (uint64, little endian) | JSON header | arrays
+
+Each array starts on a 64-byte boundary and is described in the header by
+dtype, shape and offset, so ``load_model`` can memory-map it directly.  The
+header also records the SHA-256 of the training file the model came from.
+
+NumPy is imported on first use: ``read_views`` maps the arrays with the
+standard library only, for start-up-critical callers such as the CLI.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"HMMTAG\x00\x01"
+VERSION = 2
+ALIGN = 64
+
+
+class StaleModelError(ValueError):
+    """The artifact does not match the current training file or format version."""
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _pad(offset):
+    return -offset % ALIGN
+
+
+def write_artifact(path, arrays, meta):
+    """Write ``arrays`` (name -> ndarray) and the JSON-able ``meta`` dict to ``path``."""
+    import numpy as np
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset += _pad(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    header = json.dumps(dict(meta, version=VERSION, arrays=layout)).encode("utf-8")
+    prefix = len(MAGIC) + 8 + len(header)
+    header += b" " * _pad(prefix)
+    base = prefix + _pad(prefix)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<Q", len(header)))
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(base + layout[name]["offset"])
+            file.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def _read_header(file, path):
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not a model artifact")
+    prefix = file.read(8)
+    if len(prefix) != 8:
+        raise ValueError(f"{path} is truncated")
+    (length,) = struct.unpack("<Q", prefix)
+    header = file.read(length)
+    if len(header) != length:
+        raise ValueError(f"{path} is truncated")
+    meta = json.loads(header)
+    if meta.get("version") != VERSION:
+        raise StaleModelError(f"{path} has format version {meta.get('version')}, expected {VERSION}")
+    return meta, file.tell()
+
+
+def _check_extent(path, name, start, size, file_size):
+    if start + size > file_size:
+        raise ValueError(f"{path} is truncated: array {name} ends at byte {start + size} of {file_size}")
+
+
+def read_artifact(path, mmap=True):
+    """Return ``(meta, arrays)``; arrays are read-only memory maps when ``mmap`` is set."""
+    import numpy as np
+
+    with open(path, "rb") as file:
+        meta, base = _read_header(file, path)
+        file_size = os.fstat(file.fileno()).st_size
+        arrays = {}
+        for name, spec in meta.pop("arrays").items():
+            dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+            offset = base + spec["offset"]
+            _check_extent(path, name, offset, dtype.itemsize * int(np.prod(shape)), file_size)
+            if mmap and int(np.prod(shape)):
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+            else:
+                file.seek(offset)
+                count = int(np.prod(shape))
+                arrays[name] = np.fromfile(file, dtype=dtype, count=count).reshape(shape)
+    return meta, arrays
+
+
+# memoryview formats of the little-endian dtypes the artifacts use
+_FORMATS = {"<f8": "d", "<f4": "f", "|i1": "b", "<i2": "h", "<i4": "i", "<i8": "q", "|u1": "B"}
+
+
+def read_views(path):
+    """Return ``(meta, views)`` with each array as a read-only ``memoryview`` of the file.
+
+    Multi-dimensional arrays are cast to their shape (use ``tolist``).
+    Needs a little-endian machine and only the dtypes in ``_FORMATS``.
+    """
+    if sys.byteorder != "little":
+        raise ValueError("memoryview access needs a little-endian machine, use read_artifact")
+    with open(path, "rb") as file:
+        meta, base = _read_header(file, path)
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    buffer = memoryview(mapped)
+    views = {}
+    for name, spec in meta.pop("arrays").items():
+        fmt = _FORMATS.get(spec["dtype"])
+        if fmt is None:
+            raise ValueError(f"{path}: array {name} has unsupported dtype {spec['dtype']}")
+        shape = spec["shape"]
+        size = struct.calcsize(fmt)
+        for extent in shape:
+            size *= extent
+        start = base + spec["offset"]
+        _check_extent(path, name, start, size, len(buffer))
+        views[name] = buffer[start:start + size].cast(fmt, shape)
+    return meta, views
+
+
+def check_source(meta, train_path, path="model"):
+    """Raise ``StaleModelError`` unless ``meta`` was built from ``train_path`` as it is now."""
+    if meta.get("source_sha256") != file_hash(train_path):
+        raise StaleModelError(f"{path} was not trained on the current {train_path}")
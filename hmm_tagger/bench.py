@@ -0,0 +1,265 @@
+"""Reproducible throughput benchmarks for training and decoding.
+
+Every case (corpus x engine) runs in a fresh process so its peak RSS is its
+own, and parsing, training and decoding are timed separately.  Results are
+written as JSON together with the commit and library versions, and two
+result files can be compared with ``--compare``.
+
+Engines:
+
+* ``task2``   -- ``transition``/``emission``/``viterbi`` from Task2.py
+* ``model``   -- ``HMMCounts`` + ``HMMModel.decode`` one sentence at a time
+* ``batch``   -- ``HMMModel.decode_batch``
+* ``kbest-K`` -- ``k_viterbi`` from Task3.py with k = K
+* ``trigram`` -- second-order ``TrigramModel.decode``
+* ``corpus``  -- the binary corpus cache: building and saving it
+  (``corpus_build``), then counting from the memory-mapped cache (``train``),
+  the path re-training takes; nothing is decoded
+
+Usage::
+
+    python -m hmm_tagger.bench --scales 10 100 --tags 7 31 -o bench_results.json
+    python -m hmm_tagger.bench --compare old.json bench_results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from hmm_tagger.conll import read_sentences, read_tagged_sentences
+
+ENGINES = ["task2", "model", "batch", "kbest-1", "kbest-2", "kbest-8", "trigram", "corpus"]
+LANGUAGES = ["ES", "RU"]
+
+
+def synthesize(train_path, out_dir, scale, num_tags, seed=0):
+    """Write a synthetic train/test pair ``scale`` times the size of ``train_path``.
+
+    Sentence lengths follow the real corpus; tags come from a random Markov
+    chain over ``num_tags`` tags (``O`` plus B-/I- pairs) and words from a
+    Zipf-like vocabulary per tag.  Returns ``(train, test)`` paths.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = np.array([len(tags) for _, tags in read_tagged_sentences(train_path)])
+    kinds = [f"t{i}" for i in range((num_tags - 1) // 2)]
+    tags = ["O"] + [f"{p}-{kind}" for kind in kinds for p in "BI"]
+    num_tags = len(tags)
+    start = rng.dirichlet(np.ones(num_tags))
+    transition = rng.dirichlet(np.ones(num_tags) * 0.3, size=num_tags)
+    vocab_size = 2000 * max(1, int(np.sqrt(scale)))
+    ranks = np.arange(1, vocab_size + 1)
+    zipf = 1 / ranks / (1 / ranks).sum()
+    word_offsets = rng.integers(0, vocab_size, size=num_tags)
+
+    os.makedirs(out_dir, exist_ok=True)
+    name = f"{os.path.basename(os.path.dirname(train_path))}-x{scale}-t{num_tags}"
+    paths = (os.path.join(out_dir, f"{name}.train"), os.path.join(out_dir, f"{name}.test"))
+    counts = (len(lengths) * scale, max(1, len(lengths) // 10))
+    cumulative = transition.cumsum(axis=1)
+    for path, count in zip(paths, counts):
+        with open(path, "w", encoding="utf-8") as file:
+            # Sample blocks of sentences position by position, all sentences at once
+            for first in range(0, count, 10000):
+                block = rng.choice(lengths, size=min(10000, count - first))
+                states = np.empty((len(block), block.max()), dtype=np.int64)
+                states[:, 0] = rng.choice(num_tags, size=len(block), p=start)
+                for w in range(1, states.shape[1]):
+                    draw = rng.random(len(block))[:, None]
+                    states[:, w] = np.minimum((draw > cumulative[states[:, w - 1]]).sum(axis=1), num_tags - 1)
+                words = (word_offsets[states] + rng.choice(vocab_size, size=states.shape, p=zipf)) % vocab_size
+                file.write("".join(
+                    "".join(f"w{word} {tags[state]}\n" for word, state in zip(words[i, :n], states[i, :n])) + "\n"
+                    for i, n in enumerate(block)))
+    return paths
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def _stage(seconds, tokens, latencies=None):
+    stage = {"seconds": seconds, "tokens": tokens,
+             "tokens_per_sec": tokens / seconds if seconds else None}
+    if latencies:
+        stage["p50_ms"] = float(np.percentile(latencies, 50) * 1e3)
+        stage["p99_ms"] = float(np.percentile(latencies, 99) * 1e3)
+    return stage
+
+
+def _decode_each(decode, sentences):
+    latencies = []
+    for words in sentences:
+        start = time.perf_counter()
+        decode(words)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_case(case):
+    """Run one benchmark case and return its measurements."""
+    from hmm_tagger.corpus import Corpus, cache_path
+    from hmm_tagger.counts import HMMCounts, read_tagged_file
+    from hmm_tagger.model import HMMModel
+
+    engine = case["engine"]
+    (words, tags, lengths), parse_seconds = _timed(read_tagged_file, case["train"])
+    test = list(read_sentences(case["test"]))
+    train_tokens, test_tokens = len(tags), sum(map(len, test))
+    result = dict(case, train_tokens=train_tokens, test_tokens=test_tokens,
+                  parse=_stage(parse_seconds, train_tokens))
+
+    if engine == "task2":
+        import Task2
+        test_words = [w for sentence in test for w in sentence]
+        start = time.perf_counter()
+        transition_parameters = Task2.transition(tags)
+        emission_parameters = Task2.emission(tags, words, test_words)
+        result["train"] = _stage(time.perf_counter() - start, train_tokens)
+        tag_set = np.unique(tags)
+
+        def decode(sentence):
+            return Task2.viterbi(sentence, tag_set, transition_parameters, emission_parameters)
+    elif engine == "trigram":
+        from hmm_tagger.trigram import TrigramModel
+
+        model, seconds = _timed(TrigramModel.from_sequences, words, tags, lengths)
+        result["train"] = _stage(seconds, train_tokens)
+        decode = model.decode
+    elif engine == "corpus":
+        start = time.perf_counter()
+        Corpus.from_file(case["train"]).save(cache_path(case["train"]))
+        result["corpus_build"] = _stage(time.perf_counter() - start, train_tokens)
+        start = time.perf_counter()
+        HMMModel.from_counts(HMMCounts.from_corpus(Corpus.load(cache_path(case["train"]))))
+        result["train"] = _stage(time.perf_counter() - start, train_tokens)
+        result["max_rss_kb"] = peak_rss_kb()
+        return result
+    else:
+        start = time.perf_counter()
+        counts = HMMCounts.from_sequences(words, tags, lengths)
+        model = HMMModel.from_counts(counts)
+        result["train"] = _stage(time.perf_counter() - start, train_tokens)
+        decode = model.decode
+        if engine.startswith("kbest-"):
+            import Task3
+            k = int(engine.split("-")[1])
+
+            def decode(sentence):
+                return Task3.k_viterbi(model, sentence, k)
+
+    if engine == "batch":
+        _, seconds = _timed(model.decode_batch, test)
+        result["decode"] = _stage(seconds, test_tokens)
+    else:
+        latencies = _decode_each(decode, test)
+        result["decode"] = _stage(sum(latencies), test_tokens, latencies)
+    result["max_rss_kb"] = peak_rss_kb()
+    return result
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB.
+
+    ``ru_maxrss`` survives ``exec`` and would include the parent's peak in a
+    spawned worker, so the per-process ``VmHWM`` is preferred where available.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _isolated(case):
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (case,))
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def build_cases(data_dir, languages, engines, scales, tag_sizes, work_dir):
+    cases = []
+    for language in languages:
+        train = os.path.join(data_dir, language, "train")
+        corpora = [(language, train, os.path.join(data_dir, language, "dev.in"))]
+        for scale in scales:
+            for num_tags in tag_sizes:
+                corpora.append((f"{language}-x{scale}-t{num_tags}",
+                                *synthesize(train, work_dir, scale, num_tags)))
+        for corpus, train_path, test_path in corpora:
+            for engine in engines:
+                cases.append({"corpus": corpus, "engine": engine, "train": train_path, "test": test_path})
+    return cases
+
+
+def compare(old_path, new_path):
+    """Print the throughput ratio of ``new`` over ``old`` per case and stage."""
+    def load(path):
+        with open(path, encoding="utf-8") as file:
+            return {(r["corpus"], r["engine"]): r for r in json.load(file)["results"]}
+    old, new = load(old_path), load(new_path)
+    for key in sorted(old.keys() & new.keys()):
+        cells = []
+        for stage in ("parse", "train", "corpus_build", "decode"):
+            if stage not in old[key] or stage not in new[key]:
+                continue
+            before, after = old[key][stage]["tokens_per_sec"], new[key][stage]["tokens_per_sec"]
+            if before and after:
+                cells.append(f"{stage} x{after / before:.2f}")
+        print(f"{key[0]:<16} {key[1]:<8} " + "  ".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", default="Data")
+    parser.add_argument("--languages", nargs="*", default=LANGUAGES)
+    parser.add_argument("--engines", nargs="*", default=ENGINES, choices=ENGINES)
+    parser.add_argument("--scales", nargs="*", type=int, default=[], help="synthetic scale-ups, e.g. 10 100 1000")
+    parser.add_argument("--tags", nargs="*", type=int, default=[7], help="synthetic tag-set sizes")
+    parser.add_argument("--work-dir", default=os.path.join("Data", "bench"))
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    results = []
+    for case in build_cases(args.data, args.languages, args.engines, args.scales, args.tags, args.work_dir):
+        result = _isolated(case)
+        results.append(result)
+        decode = result.get("decode", {})
+        print(f"{result['corpus']:<16} {result['engine']:<8} "
+              f"train {result['train']['tokens_per_sec']:>12,.0f} tok/s  "
+              f"decode {decode.get('tokens_per_sec') or float('nan'):>10,.0f} tok/s  "
+              f"p99 {decode.get('p99_ms', float('nan')):.2f} ms  "
+              f"rss {result['max_rss_kb'] / 1024:.0f} MB", flush=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"environment": environment(), "results": results}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
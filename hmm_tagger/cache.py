@@ -0,0 +1,99 @@
+"""Bounded LRU cache of decoded paths.
+
+Review data repeats whole sentences (boilerplate, duplicated lines), so a
+decoder can skip the lattice for any token-id sequence it has already seen.
+Entries are keyed by ``(k, token ids)`` with ``k=None`` for the single best
+path, and are evicted least-recently-used once the estimated size exceeds
+``max_bytes``.  A cache is bound to one model version: binding it to a
+model with a different ``HMMModel.fingerprint`` empties it.
+"""
+from collections import OrderedDict
+
+# 64 MiB holds roughly half a million short sentences
+MAX_BYTES = 64 << 20
+# Rough per-entry cost of the dict slot, key bytes object and tuples
+ENTRY_OVERHEAD = 200
+
+
+def _size(key, value):
+    k, ids = key
+    if k is None:
+        return ENTRY_OVERHEAD + len(ids) + 8 * len(value)
+    return ENTRY_OVERHEAD + len(ids) + sum(80 + 8 * len(path) for _, path in value)
+
+
+class DecodeCache:
+    """LRU map from ``(k, token-id bytes)`` to tag-id paths or ranked k-best lists."""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def bind(self, version):
+        """Attach the cache to a model version, dropping entries of any other version."""
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.clear()
+            self.version = version
+
+    def copy(self):
+        """Return an independent cache with the same version and entries (counters start at 0)."""
+        cache = DecodeCache(self.max_bytes)
+        cache.version = self.version
+        cache.entries = OrderedDict(self.entries)
+        cache.bytes = self.bytes
+        return cache
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    @staticmethod
+    def key(word_ids, k=None):
+        return k, word_ids.tobytes()
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        size = _size(key, value)
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= _size(key, old)
+        self.entries[key] = value
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            old_key, old = self.entries.popitem(last=False)
+            self.bytes -= _size(old_key, old)
+            self.evictions += 1
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
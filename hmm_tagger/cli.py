@@ -0,0 +1,165 @@
+"""Command-line interface: ``python -m hmm_tagger COMMAND ...``.
+
+Commands::
+
+    train  TRAIN -o MODEL [-k K] [--floor F] [--unk tag|total] [--cached]
+           [--precision float64|float32|int32|int16] [--order 1|2]
+    tag    MODEL INPUT [-o OUTPUT] [--workers N] [--cache-bytes B] [--train TRAIN] [--order 1|2]
+    kbest  MODEL INPUT -k K --ranks 2 8 -o 'dev.p3.{rank}.out' [--workers N]
+    eval   GOLD PREDICTED [PREDICTED ...]
+    bench  [bench options]
+
+Each command imports what it needs when it runs.  ``tag`` with a single
+worker decodes through ``hmm_tagger.lite`` and never imports NumPy, so
+tagging a file from a saved model starts in a few tens of milliseconds.
+``--order 2`` trains and tags with the second-order ``TrigramModel``.
+"""
+import argparse
+import sys
+
+
+def _train(args):
+    if args.order == 2:
+        from hmm_tagger.trigram import TrigramModel
+
+        model = TrigramModel.from_file(args.train, args.k)
+        model.save(args.output)
+        print(f"{args.output}: {model.num_tags} tags, {len(model.vocab)} words, order 2", file=sys.stderr)
+        return 0
+    from hmm_tagger.model import HMMModel
+
+    model = HMMModel.from_file(args.train, args.k, args.floor, args.unk, args.cached)
+    model.save(args.output, args.precision)
+    print(f"{args.output}: {model.num_tags} tags, {len(model.vocab)} words, {args.precision}", file=sys.stderr)
+    return 0
+
+
+def _tag(args):
+    from hmm_tagger.conll import tag_file
+
+    output = sys.stdout if args.output == "-" else args.output
+    if args.order == 2:
+        from hmm_tagger.trigram import TrigramModel
+
+        if args.workers != 1 or args.cache_bytes:
+            raise ValueError("--workers and --cache-bytes only apply to first-order models")
+        tag_file(args.input, output, TrigramModel.load(args.model, args.train).decode_batch)
+        return 0
+    if args.workers == 1 and not args.cache_bytes:
+        from hmm_tagger.lite import LiteModel
+
+        model = LiteModel.load(args.model, args.train)
+        tag_file(args.input, output, model.decode_batch)
+        return 0
+    if args.train is not None:
+        from hmm_tagger.artifact import check_source, read_artifact
+
+        check_source(read_artifact(args.model)[0], args.train, args.model)
+    if args.workers == 1:
+        from hmm_tagger.cache import DecodeCache
+        from hmm_tagger.model import HMMModel
+
+        model = HMMModel.load(args.model).use_cache(DecodeCache(args.cache_bytes))
+        tag_file(args.input, output, model.decode_batch)
+    else:
+        from hmm_tagger.parallel import parallel_tag_file
+
+        parallel_tag_file(args.model, args.input, output, args.workers, cache_bytes=args.cache_bytes)
+    return 0
+
+
+def _kbest(args):
+    from hmm_tagger.parallel import parallel_kbest_file
+
+    ranks = args.ranks or list(range(1, args.k + 1))
+    if max(ranks) > args.k or min(ranks) < 1:
+        print(f"ranks must be between 1 and k={args.k}", file=sys.stderr)
+        return 2
+    out_paths = {rank: args.output.format(rank=rank) for rank in ranks}
+    if len(set(out_paths.values())) < len(out_paths):
+        print("the output pattern must contain {rank}", file=sys.stderr)
+        return 2
+    parallel_kbest_file(args.model, args.input, out_paths, args.k, args.workers, cache_bytes=args.cache_bytes)
+    return 0
+
+
+def _eval(args):
+    from hmm_tagger import evaluate
+
+    return evaluate.main([args.gold] + args.predicted)
+
+
+def _bench(args, options):
+    from hmm_tagger import bench
+
+    return bench.main(options)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m hmm_tagger", description="HMM sequence tagger.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train = commands.add_parser("train", help="train a model and save it as an artifact")
+    train.add_argument("train", help="tagged training file")
+    train.add_argument("-o", "--output", required=True, help="model artifact to write")
+    train.add_argument("-k", type=float, default=1, help="emission smoothing constant")
+    train.add_argument("--floor", type=float, default=1e-10, help="probability of unseen transitions")
+    train.add_argument("--unk", choices=("tag", "total"), default="tag", help="#UNK# smoothing strategy")
+    train.add_argument("--cached", action="store_true",
+                       help="count from the binary corpus cache TRAIN.corpus, building it if needed")
+    train.add_argument("--precision", choices=("float64", "float32", "int32", "int16"), default="float64",
+                       help="storage precision of the log-probability tables (see hmm_tagger.precision)")
+    train.add_argument("--order", type=int, choices=(1, 2), default=1,
+                       help="HMM order; 2 trains the trigram model (only -k applies)")
+    train.set_defaults(run=_train)
+
+    tag = commands.add_parser("tag", help="Viterbi-tag a file of one-token-per-line sentences")
+    tag.add_argument("model")
+    tag.add_argument("input")
+    tag.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    tag.add_argument("--workers", type=int, default=1, help="decoding processes (0: one per CPU)")
+    tag.add_argument("--cache-bytes", type=int, default=0, help="size of the decode cache per process")
+    tag.add_argument("--train", help="refuse to run if the model was not trained on this file as it is now")
+    tag.add_argument("--order", type=int, choices=(1, 2), default=1, help="order of the saved model")
+    tag.set_defaults(run=_tag)
+
+    kbest = commands.add_parser("kbest", help="write selected ranks of the k best paths")
+    kbest.add_argument("model")
+    kbest.add_argument("input")
+    kbest.add_argument("-k", type=int, required=True)
+    kbest.add_argument("--ranks", type=int, nargs="+", help="ranks to write (default: 1..k)")
+    kbest.add_argument("-o", "--output", required=True, help="output path pattern containing {rank}")
+    kbest.add_argument("--workers", type=int, default=1)
+    kbest.add_argument("--cache-bytes", type=int, default=0)
+    kbest.set_defaults(run=_kbest)
+
+    evaluate = commands.add_parser("eval", help="entity-level precision/recall/F")
+    evaluate.add_argument("gold")
+    evaluate.add_argument("predicted", nargs="+")
+    evaluate.set_defaults(run=_eval)
+
+    bench = commands.add_parser("bench", help="run the benchmarks (see python -m hmm_tagger.bench -h)",
+                                add_help=False)
+    bench.set_defaults(run=None)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    # bench forwards its options to hmm_tagger.bench unparsed
+    args, options = parser.parse_known_args(argv)
+    if args.command != "bench" and options:
+        parser.error(f"unrecognized arguments: {' '.join(options)}")
+    if getattr(args, "workers", 1) == 0:
+        args.workers = None
+    try:
+        if args.command == "bench":
+            return _bench(args, options)
+        return args.run(args)
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Client for the tagging service in ``hmm_tagger.server``.
+
+``TagClient`` keeps one HTTP/1.1 connection open and sends requests on it
+in turn; open several clients for concurrency.
+
+Usage::
+
+    python -m hmm_tagger.client --language ES Data/ES/dev.in > Data/ES/dev.served.out
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from hmm_tagger.conll import TaggedWriter, chunks, read_sentences
+
+
+class ServiceError(Exception):
+    """The service answered with a non-200 status."""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class TagClient:
+
+    def __init__(self, host="127.0.0.1", port=8080, path=None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        if self.path is not None:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.reader = self.writer = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, method, target, payload=None):
+        if self.writer is None:
+            await self.connect()
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.writer.write(f"{method} {target} HTTP/1.1\r\nHost: {self.host}\r\n"
+                          f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+                          .encode("latin-1") + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        reply = json.loads(await self.reader.readexactly(int(headers["content-length"])))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        if status != 200:
+            raise ServiceError(status, reply.get("error"))
+        return reply
+
+    async def tag(self, language, sentences, k=None):
+        """Tag a list of sentences (token lists or strings).
+
+        Returns one tag list per sentence, or with ``k`` one list of
+        ``(score, tags)`` pairs per sentence, best first.
+        """
+        payload = {"language": language, "sentences": sentences}
+        if k is None:
+            return (await self.request("POST", "/tag", payload))["tags"]
+        payload["k"] = k
+        reply = await self.request("POST", "/tag", payload)
+        return [[(path["score"], path["tags"]) for path in ranked] for ranked in reply["kbest"]]
+
+    async def stats(self):
+        return await self.request("GET", "/stats")
+
+
+async def _tag_file(client, language, in_path, writer, chunk_size):
+    async with client:
+        for chunk in chunks(read_sentences(in_path), chunk_size):
+            for words, tags in zip(chunk, await client.tag(language, chunk)):
+                writer.write(words, tags)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tag a file of one-token-per-line sentences with the service.")
+    parser.add_argument("input")
+    parser.add_argument("--language", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args(argv)
+    client = TagClient(args.host, args.port, args.unix)
+    with TaggedWriter(sys.stdout) as writer:
+        asyncio.run(_tag_file(client, args.language, args.input, writer, args.chunk_size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Streaming readers and writers for token-per-line files.
+
+Sentences are separated by blank lines.  Input files have one token per
+line; tagged files have ``token tag`` lines, split on the last space so
+tokens may themselves contain spaces.
+"""
+from itertools import islice
+
+from hmm_tagger import instrument
+
+BUFFER_SIZE = 1 << 20
+
+
+def _open(source, mode="r"):
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        return open(source, mode, encoding="utf-8"), True
+    return source, False
+
+
+def read_sentences(source):
+    """Yield each sentence of an untagged file as a list of tokens."""
+    file, owned = _open(source)
+    try:
+        sentence = []
+        for line in file:
+            token = line.strip()
+            if token:
+                sentence.append(token)
+            elif sentence:
+                yield sentence
+                sentence = []
+        if sentence:
+            yield sentence
+    finally:
+        if owned:
+            file.close()
+
+
+def read_tagged_sentences(source):
+    """Yield ``(tokens, tags)`` for each sentence of a tagged file."""
+    for sentence in read_sentences(source):
+        pairs = [line.rsplit(" ", 1) for line in sentence]
+        yield [token for token, _ in pairs], [tag for _, tag in pairs]
+
+
+def chunks(iterable, size):
+    """Yield lists of up to ``size`` consecutive items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def tag_sentences(sentences, decode_many, chunk_size=1024):
+    """Yield ``(tokens, tags)`` pairs, decoding ``chunk_size`` sentences per call."""
+    for chunk in chunks(sentences, chunk_size):
+        yield from zip(chunk, decode_many(chunk))
+
+
+class TaggedWriter:
+    """Write ``token tag`` sentences, flushing to disk in large chunks."""
+
+    def __init__(self, target, buffer_size=BUFFER_SIZE):
+        self.file, self._owned = _open(target, "w")
+        self.buffer_size = buffer_size
+        self._parts = []
+        self._size = 0
+
+    def write(self, tokens, tags):
+        block = "".join(f"{token} {tag}\n" for token, tag in zip(tokens, tags)) + "\n"
+        self._parts.append(block)
+        self._size += len(block)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write("".join(self._parts))
+        self._parts = []
+        self._size = 0
+
+    def close(self):
+        self.flush()
+        if self._owned:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_tagged(target, tagged, buffer_size=BUFFER_SIZE):
+    """Write an iterable of ``(tokens, tags)`` pairs to ``target``."""
+    with TaggedWriter(target, buffer_size) as writer:
+        for tokens, tags in tagged:
+            writer.write(tokens, tags)
+
+
+def tag_file(in_path, out_path, decode_many, chunk_size=1024):
+    """Tag ``in_path`` into ``out_path`` in constant memory."""
+    with instrument.source(in_path), instrument.stage("tag_file"):
+        write_tagged(out_path, tag_sentences(read_sentences(in_path), decode_many, chunk_size))
@@ -0,0 +1,126 @@
+"""Binary token-id cache of a tagged corpus.
+
+A ``word tag`` file is parsed once into
+
+* ``token_ids``        -- int32 word id of every token, sentences back to back
+* ``tag_ids``          -- int8 (int16 past 127 tags) tag id of every token
+* ``sentence_offsets`` -- int64, sentence ``i`` is ``offsets[i]:offsets[i + 1]``
+* the word string table as a ``Vocabulary`` and the tag names in the header
+
+and saved next to the source (``train`` -> ``train.corpus``) in the model
+artifact format, so later runs memory-map it instead of re-parsing.  Ids
+are assigned in first-seen order, the same as ``HMMCounts``, so counting
+a cached corpus gives exactly the counts of parsing the file.  The cache
+records the source's size, mtime and SHA-256 and is rebuilt when they no
+longer match.
+"""
+import os
+
+import numpy as np
+
+from hmm_tagger import instrument
+from hmm_tagger.artifact import StaleModelError, file_hash, read_artifact, write_artifact
+from hmm_tagger.counts import encode, read_tagged_file
+from hmm_tagger.vocab import Vocabulary
+
+
+class Corpus:
+    """A tagged corpus as flat id arrays."""
+
+    def __init__(self, tags, vocab, token_ids, tag_ids, sentence_offsets, meta=None):
+        self.tags = list(tags)
+        self.vocab = vocab
+        self.token_ids = token_ids
+        self.tag_ids = tag_ids
+        self.sentence_offsets = sentence_offsets
+        self.meta = meta or {}
+
+    @classmethod
+    def from_file(cls, path):
+        words, tags, lengths = read_tagged_file(path)
+        word_index, word_names, tag_index, tag_names = {}, [], {}, []
+        token_ids = encode(words, word_index, word_names).astype(np.int32)
+        tag_ids = encode(tags, tag_index, tag_names).astype(np.int8 if len(tag_names) <= 127 else np.int16)
+        stat = os.stat(path)
+        meta = {"source": os.path.basename(path), "source_sha256": file_hash(path),
+                "source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+        return cls(tag_names, Vocabulary.from_words(word_names), token_ids, tag_ids,
+                   np.cumsum([0] + lengths), meta)
+
+    def save(self, path):
+        arrays = {"token_ids": self.token_ids, "tag_ids": self.tag_ids,
+                  "sentence_offsets": self.sentence_offsets}
+        arrays.update(self.vocab.to_arrays())
+        write_artifact(path, arrays, dict(self.meta, kind="corpus", tags=self.tags))
+
+    @classmethod
+    def load(cls, path, source_path=None, mmap=True):
+        """Map a saved corpus; with ``source_path`` raise ``StaleModelError`` if the source changed.
+
+        An unchanged size and mtime are trusted; otherwise the source is
+        hashed, so a file that was only touched keeps its cache.
+        """
+        meta, arrays = read_artifact(path, mmap)
+        if meta.get("kind") != "corpus":
+            raise ValueError(f"{path} is not a corpus cache")
+        if source_path is not None:
+            stat = os.stat(source_path)
+            if ((meta.get("source_size"), meta.get("source_mtime_ns")) != (stat.st_size, stat.st_mtime_ns)
+                    and meta.get("source_sha256") != file_hash(source_path)):
+                raise StaleModelError(f"{path} is out of date with {source_path}")
+        tags = meta.pop("tags")
+        vocab = Vocabulary(arrays["word_blob"], arrays["word_offsets"], arrays["word_slots"])
+        return cls(tags, vocab, arrays["token_ids"], arrays["tag_ids"], arrays["sentence_offsets"], meta)
+
+    def __len__(self):
+        return len(self.sentence_offsets) - 1
+
+    @property
+    def lengths(self):
+        return np.diff(self.sentence_offsets)
+
+    @property
+    def num_tokens(self):
+        return len(self.token_ids)
+
+    def select(self, sentence_ids):
+        """Return ``(token_ids, tag_ids, lengths)`` of the given sentences, in that order."""
+        sentence_ids = np.asarray(sentence_ids, dtype=np.int64)
+        starts = self.sentence_offsets[sentence_ids]
+        lengths = self.sentence_offsets[sentence_ids + 1] - starts
+        # Token positions: each sentence's start repeated, plus 0..length-1
+        ends = np.cumsum(lengths)
+        positions = np.arange(int(ends[-1]) if len(ends) else 0) + np.repeat(starts - (ends - lengths), lengths)
+        return self.token_ids[positions], self.tag_ids[positions], lengths
+
+    def sentences(self, sentence_ids=None):
+        """Yield ``(words, tags)`` string lists, for all or the given sentences."""
+        words, offsets = self.vocab.words, self.sentence_offsets
+        token_ids, tag_ids = self.token_ids, self.tag_ids
+        for i in range(len(self)) if sentence_ids is None else sentence_ids:
+            start, end = int(offsets[i]), int(offsets[i + 1])
+            yield ([words[w] for w in token_ids[start:end].tolist()],
+                   [self.tags[t] for t in tag_ids[start:end].tolist()])
+
+
+def cache_path(path):
+    return path + ".corpus"
+
+
+def load_corpus(path, cache=None):
+    """Return the corpus of tagged file ``path``, from its cache when it is up to date.
+
+    The cache (``path + ".corpus"`` unless ``cache`` names another file) is
+    written on first use and rewritten whenever the source changes.
+    """
+    cache = cache or cache_path(path)
+    if os.path.exists(cache):
+        try:
+            with instrument.stage("load_corpus"):
+                return Corpus.load(cache, path)
+        except ValueError:
+            pass
+    with instrument.stage("parse"):
+        corpus = Corpus.from_file(path)
+    corpus.save(cache)
+    return corpus
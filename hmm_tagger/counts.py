@@ -0,0 +1,308 @@
+"""Sufficient statistics of a first-order HMM tagger.
+
+The corpus is read once and every word and tag is interned to an integer id.
+All counting after that is done with ``np.bincount`` over the id arrays, so
+training time is linear in the number of tokens.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from hmm_tagger import instrument
+from hmm_tagger.conll import read_tagged_sentences
+
+START = "START"
+STOP = "STOP"
+UNK = "#UNK#"
+# How ``#UNK#`` is smoothed: k / (count(y) + k) per tag as in Task3.py, or
+# k / (N + k) for every tag as in "Task3 copy.py" (N = number of tokens)
+UNK_STRATEGIES = ("tag", "total")
+
+
+def read_tagged_file(path):
+    """Return the token and tag lists of a ``word tag`` per line file plus sentence lengths."""
+    words = []
+    tags = []
+    lengths = []
+    for sentence_words, sentence_tags in read_tagged_sentences(path):
+        words.extend(sentence_words)
+        tags.extend(sentence_tags)
+        lengths.append(len(sentence_tags))
+    return words, tags, lengths
+
+
+def encode(items, index, names):
+    """Map strings to ids, interning unseen ones into ``index``/``names``."""
+    ids = np.empty(len(items), dtype=np.int64)
+    for i, item in enumerate(items):
+        item_id = index.get(item)
+        if item_id is None:
+            item_id = index[item] = len(names)
+            names.append(item)
+        ids[i] = item_id
+    return ids
+
+
+class HMMCounts:
+    """Tag, bigram and word x tag counts of a tagged corpus.
+
+    Transition counts are kept as three tables so the tag set can grow:
+    ``start_counts[v]`` (START -> v), ``transition_counts[u, v]`` and
+    ``stop_counts[u]`` (u -> STOP).  ``transition_matrix`` lays them out as a
+    single (T + 2) x (T + 2) table with START at row T and STOP at column T + 1.
+
+    Counts are mergeable: ``update``, ``merge`` and ``subtract`` change them in
+    place and mark the tags they touch, so the probability tables are only
+    re-derived for those rows (transitions) and columns (emissions).  Ids are
+    assigned in first-seen order, so merging shard counts in order gives the
+    same ids and counts as one pass over the concatenated shards.
+    """
+
+    def __init__(self):
+        self.tags = []
+        self.tag_index = {}
+        self.words = []
+        self.word_index = {}
+        self.tag_counts = np.zeros(0, dtype=np.int64)
+        self.start_counts = np.zeros(0, dtype=np.int64)
+        self.stop_counts = np.zeros(0, dtype=np.int64)
+        self.transition_counts = np.zeros((0, 0), dtype=np.int64)
+        self.emission_counts = np.zeros((0, 0), dtype=np.int64)
+        self._transition_cache = None
+        self._emission_cache = None
+        self._dirty_rows = set()
+        self._dirty_columns = set()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(_transition_cache=None, _emission_cache=None)
+        return state
+
+    def _mark(self, tag_ids):
+        self._dirty_rows.update(tag_ids)
+        self._dirty_rows.add(self.num_tags)  # START row
+        self._dirty_columns.update(tag_ids)
+
+    @classmethod
+    def from_file(cls, path, cached=False):
+        """Count a tagged file; with ``cached`` go through its binary corpus cache (see ``corpus``)."""
+        if cached:
+            from hmm_tagger.corpus import load_corpus
+
+            return cls.from_corpus(load_corpus(path))
+        counts = cls()
+        with instrument.stage("parse"):
+            words, tags, lengths = read_tagged_file(path)
+        with instrument.stage("count"):
+            counts.add(words, tags, lengths)
+        return counts
+
+    @classmethod
+    def from_corpus(cls, corpus, sentence_ids=None):
+        """Count a ``Corpus`` (or the given sentences of it) straight from its id arrays.
+
+        The counts share the corpus' word and tag ids, so counts of different
+        sentence subsets of one corpus merge and subtract without remapping.
+        """
+        counts = cls()
+        counts.tags = list(corpus.tags)
+        counts.tag_index = {tag: i for i, tag in enumerate(counts.tags)}
+        counts.words = corpus.vocab.words
+        counts.word_index = {word: i for i, word in enumerate(counts.words)}
+        counts._grow()
+        if sentence_ids is None:
+            word_ids, tag_ids, lengths = corpus.token_ids, corpus.tag_ids, corpus.lengths
+        else:
+            word_ids, tag_ids, lengths = corpus.select(sentence_ids)
+        with instrument.stage("count"):
+            counts._count(np.asarray(word_ids, dtype=np.int64), np.asarray(tag_ids, dtype=np.int64), lengths)
+        return counts
+
+    @classmethod
+    def from_sequences(cls, words, tags, lengths=None):
+        counts = cls()
+        counts.add(words, tags, lengths)
+        return counts
+
+    @property
+    def num_tags(self):
+        return len(self.tags)
+
+    @property
+    def num_words(self):
+        return len(self.words)
+
+    def _grow(self):
+        num_words, num_tags = self.num_words, self.num_tags
+        old_words, old_tags = self.emission_counts.shape
+        if (old_words, old_tags) == (num_words, num_tags):
+            return
+        self.tag_counts = np.pad(self.tag_counts, (0, num_tags - old_tags))
+        self.start_counts = np.pad(self.start_counts, (0, num_tags - old_tags))
+        self.stop_counts = np.pad(self.stop_counts, (0, num_tags - old_tags))
+        self.transition_counts = np.pad(
+            self.transition_counts, ((0, num_tags - old_tags), (0, num_tags - old_tags)))
+        self.emission_counts = np.pad(
+            self.emission_counts, ((0, num_words - old_words), (0, num_tags - old_tags)))
+
+    def add(self, words, tags, lengths=None):
+        """Count a flat token/tag list split into sentences of the given lengths.
+
+        With ``lengths=None`` the whole list is a single sentence.  ``words`` may
+        be ``None`` to count transitions only.
+        """
+        tag_ids = encode(tags, self.tag_index, self.tags)
+        word_ids = None if words is None else encode(words, self.word_index, self.words)
+        self._grow()
+        self._count(word_ids, tag_ids, lengths)
+
+    def _count(self, word_ids, tag_ids, lengths):
+        if len(tag_ids) == 0:
+            return
+        num_tags = self.num_tags
+        if lengths is None:
+            lengths = [len(tag_ids)]
+        ends = np.cumsum(lengths)
+        starts = ends - np.asarray(lengths)
+
+        self._mark(np.unique(tag_ids).tolist())
+        self.tag_counts += np.bincount(tag_ids, minlength=num_tags)
+        self.start_counts += np.bincount(tag_ids[starts], minlength=num_tags)
+        self.stop_counts += np.bincount(tag_ids[ends - 1], minlength=num_tags)
+        inside = np.ones(len(tag_ids) - 1, dtype=bool)
+        inside[ends[:-1] - 1] = False
+        pairs = tag_ids[:-1][inside] * num_tags + tag_ids[1:][inside]
+        self.transition_counts += np.bincount(
+            pairs, minlength=num_tags * num_tags).reshape(num_tags, num_tags)
+        if word_ids is not None:
+            if len(word_ids) < self.emission_counts.size:
+                np.add.at(self.emission_counts, (word_ids, tag_ids), 1)
+            else:
+                cells = word_ids * num_tags + tag_ids
+                self.emission_counts += np.bincount(
+                    cells, minlength=self.num_words * num_tags).reshape(self.num_words, num_tags)
+
+    def update(self, sentences):
+        """Count an iterable of ``(words, tags)`` sentences."""
+        words, tags, lengths = [], [], []
+        for sentence_words, sentence_tags in sentences:
+            if sentence_tags:
+                words.extend(sentence_words)
+                tags.extend(sentence_tags)
+                lengths.append(len(sentence_tags))
+        self.add(words, tags, lengths)
+
+    def _combine(self, other, sign):
+        if sign < 0 and (not set(other.tag_index) <= set(self.tag_index)
+                         or not set(other.word_index) <= set(self.word_index)):
+            raise ValueError("cannot subtract counts of words or tags that were never added")
+        tag_map = encode(other.tags, self.tag_index, self.tags)
+        word_map = encode(other.words, self.word_index, self.words)
+        self._grow()
+        changed = np.flatnonzero(other.tag_counts)
+        if sign < 0 and (np.any(self.tag_counts[tag_map] < other.tag_counts)
+                         or np.any(self.start_counts[tag_map] < other.start_counts)
+                         or np.any(self.stop_counts[tag_map] < other.stop_counts)
+                         or np.any(self.transition_counts[np.ix_(tag_map, tag_map)] < other.transition_counts)
+                         or np.any(self.emission_counts[np.ix_(word_map, tag_map)] < other.emission_counts)):
+            raise ValueError("subtracting more occurrences than were counted")
+        self.tag_counts[tag_map] += sign * other.tag_counts
+        self.start_counts[tag_map] += sign * other.start_counts
+        self.stop_counts[tag_map] += sign * other.stop_counts
+        self.transition_counts[np.ix_(tag_map, tag_map)] += sign * other.transition_counts
+        self.emission_counts[np.ix_(word_map, tag_map)] += sign * other.emission_counts
+        self._mark(tag_map[changed].tolist())
+
+    def merge(self, other):
+        """Add the counts of ``other`` (e.g. another shard) to these counts."""
+        self._combine(other, 1)
+        return self
+
+    def subtract(self, other):
+        """Remove counts previously added from ``other``; words and tags keep their ids."""
+        self._combine(other, -1)
+        return self
+
+    def copy(self, dtype=None):
+        """Return an independent copy, with the count arrays cast to ``dtype`` if given.
+
+        Float copies can accumulate expected (fractional) counts, e.g. in EM.
+        """
+        counts = HMMCounts()
+        counts.tags, counts.tag_index = list(self.tags), dict(self.tag_index)
+        counts.words, counts.word_index = list(self.words), dict(self.word_index)
+        for name in ("tag_counts", "start_counts", "stop_counts", "transition_counts", "emission_counts"):
+            array = getattr(self, name)
+            setattr(counts, name, array.astype(dtype or array.dtype))
+        return counts
+
+    def transition_matrix(self):
+        """Return the (T + 2) x (T + 2) count table with START/STOP rows and columns.
+
+        The table keeps the counts' dtype, so expected (float) counts are not truncated.
+        """
+        num_tags = self.num_tags
+        dtype = np.result_type(self.transition_counts, self.start_counts, self.stop_counts)
+        table = np.zeros((num_tags + 2, num_tags + 2), dtype=dtype)
+        table[:num_tags, :num_tags] = self.transition_counts
+        table[num_tags, :num_tags] = self.start_counts
+        table[:num_tags, num_tags + 1] = self.stop_counts
+        return table
+
+    def transition_probabilities(self):
+        """Return P(v | u) over the START/STOP layout; the STOP row is all zeros.
+
+        Only the rows marked dirty since the last call are recomputed in an
+        internal cache; the caller gets a copy, which later updates leave alone.
+        """
+        table = self.transition_matrix()
+        totals = table.sum(axis=1, keepdims=True)
+        cache = self._transition_cache
+        if cache is None or cache.shape != table.shape:
+            cache = np.divide(table, totals, out=np.zeros(table.shape), where=totals > 0)
+        else:
+            rows = sorted(self._dirty_rows)
+            cache[rows] = np.divide(table[rows], totals[rows], out=np.zeros((len(rows), len(table))),
+                                    where=totals[rows] > 0)
+        self._transition_cache = cache
+        self._dirty_rows.clear()
+        return cache.copy()
+
+    def emission_probabilities(self, k=1, unk="tag"):
+        """Return the word x tag emission table and the ``#UNK#`` row, smoothed with ``k``.
+
+        ``unk`` picks one of ``UNK_STRATEGIES`` for the ``#UNK#`` row.  Like
+        ``transition_probabilities`` only the dirty tag columns (and rows of
+        words added since the last call) are recomputed, and the caller gets
+        copies of the cached table.
+        """
+        if unk not in UNK_STRATEGIES:
+            raise ValueError(f"unknown #UNK# strategy {unk!r}, expected one of {UNK_STRATEGIES}")
+        denominator = self.tag_counts + k
+        cached_k, emissions = self._emission_cache or (None, None)
+        if cached_k != k or emissions.shape[1] != self.num_tags:
+            emissions = self.emission_counts / denominator
+        else:
+            old_words = len(emissions)
+            if old_words < self.num_words:
+                emissions = np.vstack([emissions, self.emission_counts[old_words:] / denominator])
+            columns = sorted(self._dirty_columns)
+            emissions[:, columns] = self.emission_counts[:, columns] / denominator[columns]
+        self._emission_cache = (k, emissions)
+        self._dirty_columns.clear()
+        if unk == "total":
+            return emissions.copy(), np.full(self.num_tags, k / (self.tag_counts.sum() + k))
+        return emissions.copy(), k / denominator
+
+
+def count_files(paths, workers=None):
+    """Count each training shard in its own process and merge them in order.
+
+    The result is identical to ``HMMCounts.from_file`` on the concatenation
+    of ``paths``.
+    """
+    total = HMMCounts()
+    with ProcessPoolExecutor(workers) as pool:
+        for shard in pool.map(HMMCounts.from_file, paths):
+            total.merge(shard)
+    return total
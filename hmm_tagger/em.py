@@ -0,0 +1,179 @@
+"""Semi-supervised Baum-Welch training on untagged text.
+
+Training starts from the supervised counts of a tagged file.  Every
+iteration saves the current model as an artifact; worker processes
+memory-map it and run forward-backward over one untagged shard each, chunk
+by chunk, so a worker holds at most ``chunk_size`` sentences plus its
+shard's word x tag expected counts.  The parent adds the shards' expected
+counts (times ``weight``) to the supervised counts and re-estimates the
+model with the usual ``k`` smoothing and transition floor.
+
+Usage::
+
+    python -m hmm_tagger.em Data/ES/train unlabeled/*.txt --iterations 5 --workers 4 -o es.em.hmm --dev Data/ES
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from hmm_tagger.conll import chunks, read_sentences, read_tagged_sentences
+from hmm_tagger.counts import HMMCounts, encode
+from hmm_tagger.evaluate import score
+from hmm_tagger.model import FLOOR, HMMModel
+from hmm_tagger.posterior import ExpectedCounts
+
+CHUNK_SIZE = 4096
+
+_model = None
+_model_path = None
+
+
+def _load(model_path):
+    global _model, _model_path
+    if model_path != _model_path:
+        _model, _model_path = HMMModel.load(model_path), model_path
+    return _model
+
+
+def expected_counts(model, sentences, chunk_size=CHUNK_SIZE):
+    """Expected counts of untagged ``sentences`` under ``model``.
+
+    Returns a float ``HMMCounts`` over the model's tags and the words of
+    ``sentences``, and a dict with the log-likelihood, sentence and token
+    totals and the number of sentences the model gives zero probability.
+    """
+    counts = HMMCounts()
+    counts.tags = list(model.tags)
+    counts.tag_index = {tag: i for i, tag in enumerate(counts.tags)}
+    num_tags = counts.num_tags
+    counts.tag_counts = np.zeros(num_tags)
+    counts.start_counts = np.zeros(num_tags)
+    counts.stop_counts = np.zeros(num_tags)
+    counts.transition_counts = np.zeros((num_tags, num_tags))
+    counts.emission_counts = np.zeros((0, num_tags))
+    info = {"log_likelihood": 0.0, "sentences": 0, "tokens": 0, "impossible": 0}
+    # Model word id of each local word id, so every word type is looked up once
+    model_ids = np.zeros(0, dtype=np.int64)
+    for chunk in chunks(sentences, chunk_size):
+        word_ids = encode([word for words in chunk for word in words], counts.word_index, counts.words)
+        if counts.num_words > len(model_ids):
+            model_ids = np.append(model_ids, model.word_ids(counts.words[len(model_ids):]))
+        counts._grow()
+        dense = model.emissions.dense(model_ids[word_ids])
+        ends = np.cumsum([len(words) for words in chunk])
+        result = ExpectedCounts(model.log_transition, np.split(dense, ends[:-1]))
+        posteriors = np.concatenate(result.posteriors)
+        # Sum the posteriors of each distinct word, then add them in one go
+        order = np.argsort(word_ids, kind="stable")
+        sorted_ids = word_ids[order]
+        firsts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        counts.emission_counts[sorted_ids[firsts]] += np.add.reduceat(posteriors[order], firsts)
+        counts.tag_counts += posteriors.sum(axis=0)
+        counts.start_counts += result.start
+        counts.stop_counts += result.stop
+        counts.transition_counts += result.transitions
+        info["log_likelihood"] += result.log_likelihood
+        info["sentences"] += len(chunk)
+        info["tokens"] += len(word_ids)
+        info["impossible"] += result.impossible
+    return counts, info
+
+
+def _e_step(model_path, shard_path, chunk_size):
+    return expected_counts(_load(model_path), read_sentences(shard_path), chunk_size)
+
+
+def _scale(counts, weight):
+    for name in ("tag_counts", "start_counts", "stop_counts", "transition_counts", "emission_counts"):
+        setattr(counts, name, getattr(counts, name) * weight)
+    return counts
+
+
+def baum_welch(counts, shard_paths, iterations=5, workers=None, k=1, floor=FLOOR, weight=1.0,
+               chunk_size=CHUNK_SIZE, work_dir=None):
+    """Yield ``(model, report)`` after each EM iteration.
+
+    ``counts`` are the supervised counts, ``shard_paths`` untagged files in
+    the ``dev.in`` format, one E-step task each.  The report gives the
+    log-likelihood of the untagged text under the previous model and the
+    time spent in the E and M steps.  The first one is not comparable with
+    later ones: the supervised model gives every unknown token the whole
+    ``#UNK#`` probability instead of sharing it among the unseen words.
+    """
+    workers = workers or min(len(shard_paths), os.cpu_count() or 1)
+    model = HMMModel.from_counts(counts, k, floor)
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp, \
+            ProcessPoolExecutor(workers) if workers > 1 else _InProcess() as pool:
+        for iteration in range(1, iterations + 1):
+            start = time.perf_counter()
+            model_path = os.path.join(tmp, f"iteration-{iteration - 1}.hmm")
+            model.save(model_path)
+            shards = list(pool.map(_e_step, [model_path] * len(shard_paths), shard_paths,
+                                   [chunk_size] * len(shard_paths)))
+            os.remove(model_path)
+            e_step = time.perf_counter()
+
+            total = counts.copy(float)
+            for shard, _ in shards:
+                total.merge(_scale(shard, weight) if weight != 1 else shard)
+            model = HMMModel.from_counts(total, k, floor)
+            model.meta.update(em_iterations=iteration, em_weight=weight)
+            end = time.perf_counter()
+
+            report = {"iteration": iteration}
+            for name in ("log_likelihood", "sentences", "tokens", "impossible"):
+                report[name] = sum(info[name] for _, info in shards)
+            report.update(e_step_seconds=e_step - start, m_step_seconds=end - e_step, seconds=end - start)
+            yield model, report
+
+
+class _InProcess:
+    """Stand-in for a process pool that maps in the calling process."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Baum-Welch training on untagged text.")
+    parser.add_argument("train", help="tagged training file for the initial counts")
+    parser.add_argument("unlabeled", nargs="+", help="untagged shards, one sentence per blank-line block")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("-k", type=float, default=1)
+    parser.add_argument("--weight", type=float, default=1.0, help="weight of the expected counts")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--dev", help="directory with dev.in and dev.out to score after each iteration")
+    parser.add_argument("-o", "--output", help="save the final model here")
+    args = parser.parse_args(argv)
+
+    if args.dev:
+        dev = list(read_tagged_sentences(os.path.join(args.dev, "dev.out")))
+    counts = HMMCounts.from_file(args.train)
+    model = None
+    for model, report in baum_welch(counts, args.unlabeled, args.iterations, args.workers, args.k,
+                                    weight=args.weight, chunk_size=args.chunk_size):
+        if args.dev:
+            predicted = model.decode_batch([words for words, _ in dev])
+            report["dev_f1"] = score([tags for _, tags in dev], predicted).sentiment[2]
+        print(json.dumps(report), flush=True)
+    if args.output and model is not None:
+        model.meta.update(source=os.path.basename(args.train))
+        model.save(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
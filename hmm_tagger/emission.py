@@ -0,0 +1,103 @@
+"""Sparse word x tag emission log-probabilities in CSR layout.
+
+Row ``i`` holds the tags word ``i`` was seen with; the last row is the dense
+``#UNK#`` row.  ``indices`` are tag ids, ``data`` the matching log-probs,
+stored at ``precision`` (see ``hmm_tagger.precision``).
+"""
+import numpy as np
+
+from hmm_tagger.precision import get_precision
+
+
+class SparseEmissions:
+
+    def __init__(self, indptr, indices, data, num_tags, precision=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.num_tags = num_tags
+        self.precision = get_precision(precision)
+
+    @classmethod
+    def from_probabilities(cls, emissions, unk):
+        """Build from a dense word x tag probability table and the ``#UNK#`` row."""
+        num_tags = emissions.shape[1]
+        table = np.vstack([emissions, unk])
+        rows, tags = np.nonzero(table)
+        indptr = np.zeros(len(table) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=len(table)), out=indptr[1:])
+        index_type = np.int8 if num_tags <= 127 else np.int16
+        return cls(indptr, tags.astype(index_type), np.log(table[rows, tags]), num_tags)
+
+    def to_arrays(self):
+        return {"emission_indptr": self.indptr, "emission_indices": self.indices,
+                "emission_data": self.data}
+
+    @classmethod
+    def from_arrays(cls, arrays, num_tags, precision=None):
+        return cls(arrays["emission_indptr"], arrays["emission_indices"],
+                   arrays["emission_data"], num_tags, precision)
+
+    def with_precision(self, precision):
+        """Return a copy with ``data`` converted to another precision."""
+        precision = get_precision(precision)
+        data = precision.quantize(self.precision.dequantize(self.data))
+        return SparseEmissions(self.indptr, self.indices, data, self.num_tags, precision)
+
+    @property
+    def unk_id(self):
+        """Row id of ``#UNK#``."""
+        return len(self.indptr) - 2
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def column(self, word_id):
+        """Return the (tag ids, log-probs) of a word as views into the table."""
+        a, b = self.indptr[word_id], self.indptr[word_id + 1]
+        return self.indices[a:b], self.data[a:b]
+
+    def dense(self, word_ids):
+        """Return the (n, T) log-prob slice for ``word_ids``, ``-inf`` where unseen.
+
+        The slice has the precision's decoding dtype, with its ``impossible``
+        value in place of ``-inf``.
+        """
+        precision = self.precision
+        out = np.full((len(word_ids), self.num_tags), precision.impossible, dtype=precision.accumulator)
+        starts = self.indptr[word_ids]
+        lengths = self.indptr[np.asarray(word_ids) + 1] - starts
+        total = int(lengths.sum())
+        if total:
+            rows = np.repeat(np.arange(len(word_ids)), lengths)
+            ends = np.cumsum(lengths)
+            positions = np.arange(total) - np.repeat(ends - lengths - starts, lengths)
+            out[rows, self.indices[positions]] = self.data[positions]
+        return out
+
+    def restricted(self, min_share, k=1, tag_counts=None):
+        """Return a copy without the tags a word was seen with less than ``min_share`` of the time.
+
+        Counts are recovered from the log-probs as ``P(x | y) * (c(y) + k)``,
+        with ``c(y)`` from ``tag_counts``.  Without them ``c(y) + k`` is read
+        off the ``#UNK#`` row as ``k / P(#UNK# | y)``, which only holds for
+        the ``"tag"`` ``#UNK#`` strategy.  The ``#UNK#`` row itself is kept whole,
+        and so is each word's most frequent tag, so no word is left without one.
+        """
+        if tag_counts is not None:
+            scale = np.asarray(tag_counts, dtype=np.float64) + k
+        else:
+            unk_tags, unk_data = self.column(self.unk_id)
+            scale = np.zeros(self.num_tags)
+            scale[unk_tags] = k / np.exp(self.precision.dequantize(unk_data))
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        counts = np.exp(self.precision.dequantize(self.data)) * scale[self.indices]
+        totals = np.bincount(rows, weights=counts, minlength=len(self))
+        most = np.zeros(len(self))
+        np.maximum.at(most, rows, counts)
+        # Recovered counts carry rounding error, so ties for the top tag are kept together
+        floor = np.minimum(min_share * totals[rows], most[rows] * (1 - 1e-9))
+        keep = (counts >= floor) | (rows == self.unk_id)
+        indptr = np.zeros_like(self.indptr)
+        np.cumsum(np.bincount(rows[keep], minlength=len(self)), out=indptr[1:])
+        return SparseEmissions(indptr, self.indices[keep], self.data[keep], self.num_tags, self.precision)
@@ -0,0 +1,145 @@
+"""Entity-level precision, recall and F1 for B-/I-/O sentiment tagging.
+
+An entity starts at ``B-x``, or at an ``I-x`` that does not continue an
+entity of the same type, and runs over the following ``I-x`` tags.  The
+*entity* score counts a prediction as correct when its span matches a gold
+span; the *sentiment* score also requires the type (``positive``,
+``negative``, ...) to match.
+
+Usage::
+
+    python -m hmm_tagger.evaluate Data/ES/dev.out Data/ES/dev.p2.out [more predictions...]
+"""
+import sys
+
+from hmm_tagger.conll import read_tagged_sentences
+
+
+def entities(tags):
+    """Return the set of ``(start, end, type)`` entities in one tag sequence."""
+    found = set()
+    start = kind = None
+    for i, tag in enumerate(tags):
+        prefix, _, tag_kind = tag.partition("-")
+        if prefix == "I" and kind == tag_kind:
+            continue
+        if kind is not None:
+            found.add((start, i, kind))
+            start = kind = None
+        if prefix in ("B", "I"):
+            start, kind = i, tag_kind
+    if kind is not None:
+        found.add((start, len(tags), kind))
+    return found
+
+
+def _prf(correct, predicted, gold):
+    precision = correct / predicted if predicted else 0.0
+    recall = correct / gold if gold else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+class EntityScore:
+    """Running entity counts, fed one sentence at a time."""
+
+    def __init__(self):
+        self.gold = 0
+        self.predicted = 0
+        self.correct_entity = 0
+        self.correct_sentiment = 0
+
+    def add(self, gold_tags, predicted_tags):
+        if len(gold_tags) != len(predicted_tags):
+            raise ValueError(f"sentence length mismatch: {len(gold_tags)} gold vs {len(predicted_tags)} predicted tags")
+        gold = entities(gold_tags)
+        predicted = entities(predicted_tags)
+        self.gold += len(gold)
+        self.predicted += len(predicted)
+        self.correct_sentiment += len(gold & predicted)
+        gold_spans = {(start, end) for start, end, _ in gold}
+        self.correct_entity += sum((start, end) in gold_spans for start, end, _ in predicted)
+
+    def merge(self, other):
+        """Add the counts of another score, e.g. of another cross-validation fold."""
+        self.gold += other.gold
+        self.predicted += other.predicted
+        self.correct_entity += other.correct_entity
+        self.correct_sentiment += other.correct_sentiment
+        return self
+
+    @property
+    def entity(self):
+        """(precision, recall, F1) on spans only."""
+        return _prf(self.correct_entity, self.predicted, self.gold)
+
+    @property
+    def sentiment(self):
+        """(precision, recall, F1) on spans and types."""
+        return _prf(self.correct_sentiment, self.predicted, self.gold)
+
+    def as_dict(self):
+        result = {"gold": self.gold, "predicted": self.predicted,
+                  "correct_entity": self.correct_entity, "correct_sentiment": self.correct_sentiment}
+        for name in ("entity", "sentiment"):
+            result.update(zip((f"{name}_precision", f"{name}_recall", f"{name}_f1"), getattr(self, name)))
+        return result
+
+    def report(self):
+        lines = [f"#Entity in gold data: {self.gold}",
+                 f"#Entity in prediction: {self.predicted}", "",
+                 f"#Correct Entity : {self.correct_entity}"]
+        lines += [f"Entity  {label}: {value:.4f}" for label, value in zip(("precision", "recall", "F"), self.entity)]
+        lines += ["", f"#Correct Sentiment : {self.correct_sentiment}"]
+        lines += [f"Sentiment  {label}: {value:.4f}" for label, value in zip(("precision", "recall", "F"), self.sentiment)]
+        return "\n".join(lines)
+
+
+def score_many(gold, predictions):
+    """Score several prediction streams against one gold stream in a single pass.
+
+    ``gold`` is an iterable of tag lists and ``predictions`` maps a name to
+    an iterable of tag lists in the same sentence order; every stream must
+    have as many sentences as ``gold``.
+    """
+    scores = {name: EntityScore() for name in predictions}
+    streams = {name: iter(stream) for name, stream in predictions.items()}
+    for gold_tags in gold:
+        for name, stream in streams.items():
+            predicted_tags = next(stream, None)
+            if predicted_tags is None:
+                raise ValueError(f"prediction {name!r} has fewer sentences than the gold data")
+            scores[name].add(gold_tags, predicted_tags)
+    for name, stream in streams.items():
+        if next(stream, None) is not None:
+            raise ValueError(f"prediction {name!r} has more sentences than the gold data")
+    return scores
+
+
+def score(gold, predicted):
+    return score_many(gold, {None: predicted})[None]
+
+
+def file_tags(path):
+    return (tags for _, tags in read_tagged_sentences(path))
+
+
+def evaluate_files(gold_path, predicted_paths):
+    """Return ``{path: EntityScore}`` for each predicted file against ``gold_path``."""
+    return score_many(file_tags(gold_path), {path: file_tags(path) for path in predicted_paths})
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print("usage: python -m hmm_tagger.evaluate GOLD PREDICTED [PREDICTED ...]", file=sys.stderr)
+        return 2
+    for path, result in evaluate_files(argv[0], argv[1:]).items():
+        if len(argv) > 2:
+            print(f"== {path}")
+        print(result.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
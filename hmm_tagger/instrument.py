@@ -0,0 +1,146 @@
+"""Opt-in counters and timers for training and decoding.
+
+Instrumentation is off unless ``collecting()`` (or ``enable()``) is active;
+the hooks in the library then cost one global lookup per call.  ::
+
+    with instrument.collecting(profile_path="tag.prof") as stats:
+        Task2.process_dataset(...)
+    stats.to_json("tag_stats.json")
+
+Counters:
+
+* ``sentences``, ``tokens``  -- decoded input
+* ``oov_tokens``             -- tokens that fell back to the ``#UNK#`` row
+* ``lattice_cells``          -- (u, v) transitions scored by the decoders
+* ``kbest_candidates``       -- hypotheses ranked by the k-best decoder
+* ``floor_transitions``      -- unseen transitions (the 1e-10 floor) on decoded paths
+
+OOV counts are also kept per input file named with ``source()``.
+"""
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+stats = None
+
+_NULL = nullcontext()
+
+
+class Stats:
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.files = defaultdict(lambda: {"tokens": 0, "oov_tokens": 0})
+        self.current_file = None
+        self.memory_peak = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, **counts):
+        for name, value in counts.items():
+            self.counters[name] += int(value)
+
+    def record_decode(self, model, word_ids, paths, candidates=0, cells=None):
+        """Count one decoded sentence (``paths`` holds its 1 or k output paths).
+
+        ``cells`` is the number of lattice cells the decoder scored, by
+        default the dense ``(n - 1) * T * T``.
+        """
+        import numpy as np
+
+        n, num_tags = len(word_ids), model.num_tags
+        oov = int(np.count_nonzero(word_ids == model.emissions.unk_id))
+        floor = model.precision.quantize(np.log(model.meta.get("floor", 1e-10)))
+        transitions = model.log_transition
+        floored = 0
+        for path in paths:
+            if path:
+                states = [num_tags] + list(path) + [num_tags + 1]
+                floored += int(np.count_nonzero(transitions[states[:-1], states[1:]] == floor))
+        self.count(sentences=1, tokens=n, oov_tokens=oov, lattice_cells=max(n - 1, 0) * num_tags * num_tags if cells is None else cells,
+                   kbest_candidates=candidates, floor_transitions=floored)
+        if self.current_file is not None:
+            self.files[self.current_file]["tokens"] += n
+            self.files[self.current_file]["oov_tokens"] += oov
+
+    def as_dict(self):
+        tokens = self.counters.get("tokens", 0)
+        files = {name: dict(entry, oov_rate=entry["oov_tokens"] / entry["tokens"] if entry["tokens"] else 0.0)
+                 for name, entry in self.files.items()}
+        return {
+            "stages": {name: {"seconds": seconds, "calls": self.calls[name]} for name, seconds in self.stages.items()},
+            "counters": dict(self.counters),
+            "oov_rate": self.counters.get("oov_tokens", 0) / tokens if tokens else 0.0,
+            "files": files,
+            "memory_peak_bytes": self.memory_peak,
+        }
+
+    def to_json(self, path=None):
+        text = json.dumps(self.as_dict(), indent=2)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(text)
+        return text
+
+
+def stage(name):
+    """Time a block under ``name`` when instrumentation is on."""
+    return _NULL if stats is None else stats.stage(name)
+
+
+@contextmanager
+def source(name):
+    """Attribute the OOV counts of the enclosed decoding to input file ``name``."""
+    if stats is None:
+        yield
+        return
+    previous, stats.current_file = stats.current_file, str(name)
+    try:
+        yield
+    finally:
+        stats.current_file = previous
+
+
+def enable(new_stats=None):
+    global stats
+    stats = new_stats or Stats()
+    return stats
+
+
+def disable():
+    global stats
+    stats = None
+
+
+@contextmanager
+def collecting(profile_path=None, trace_memory=False):
+    """Enable instrumentation for a block, optionally under cProfile and tracemalloc."""
+    import cProfile
+    import tracemalloc
+
+    current = enable()
+    profiler = cProfile.Profile() if profile_path else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield current
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if trace_memory:
+            current.memory_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        disable()
@@ -0,0 +1,119 @@
+"""Pure-Python Viterbi over per-position candidate tags.
+
+These decoders take the transition matrix as nested lists and, per
+position, only the tags a word can take, so they need no NumPy at all.
+The ``hmm_tagger.lite`` start-up path and the tag-dictionary decoders of
+``HMMModel`` share them.
+"""
+import math
+
+
+def pruned_viterbi(transition_rows, columns, beam=None, threshold=None, start=None, stop=None):
+    """Viterbi over per-position candidate tags, optionally with beam pruning.
+
+    ``transition_rows`` is the log transition matrix as nested lists and
+    ``columns[w]`` a ``(tag ids, emission log-probs)`` pair of lists giving
+    the only tags allowed at position ``w``.  Candidate sets are usually one
+    or two tags, so plain Python floats beat NumPy calls here.  After each
+    position at most ``beam`` states are kept, and states scoring more than
+    ``threshold`` below the best are dropped.  With neither set the result
+    equals ``viterbi`` restricted to the allowed tags.
+
+    ``start``/``stop`` replace the START row and STOP column, so a span can
+    be decoded between two fixed tags.
+    """
+    return pruned_viterbi_cells(transition_rows, columns, beam, threshold, start, stop)[0]
+
+
+def pruned_viterbi_cells(transition_rows, columns, beam=None, threshold=None, start=None, stop=None):
+    """``pruned_viterbi`` that also returns the number of (previous, current) cells it scored."""
+    n = len(columns)
+    if n == 0:
+        return [], 0
+    if start is None:
+        start = len(transition_rows) - 2
+    if stop is None:
+        stop = len(transition_rows) - 1
+    tags, emission = columns[0]
+    row = transition_rows[start]
+    scores = [row[v] + e for v, e in zip(tags, emission)]
+    kept_tags, backpointers = [], []
+    previous = None
+    cells = 0
+    for w in range(n):
+        if w:
+            tags, emission = columns[w]
+            cells += len(previous) * len(tags)
+            scores, best = [], []
+            for v, e in zip(tags, emission):
+                top, arg = -math.inf, 0
+                for j, u in enumerate(previous):
+                    candidate = previous_scores[j] + transition_rows[u][v]
+                    if candidate + e > top:
+                        top, arg = candidate + e, j
+                scores.append(top)
+                best.append(arg)
+            backpointers.append(best)
+        if (beam is not None or threshold is not None) and len(tags) > 1:
+            keep = [i for i, score in enumerate(scores) if score > -math.inf]
+            if threshold is not None and keep:
+                floor = max(scores[i] for i in keep) - threshold
+                keep = [i for i in keep if scores[i] >= floor]
+            if beam is not None and len(keep) > beam:
+                keep = sorted(sorted(keep, key=lambda i: -scores[i])[:beam])
+            if 0 < len(keep) < len(tags):
+                tags = [tags[i] for i in keep]
+                scores = [scores[i] for i in keep]
+                if w:
+                    backpointers[-1] = [backpointers[-1][i] for i in keep]
+        previous, previous_scores = tags, scores
+        kept_tags.append(tags)
+
+    final = [score + transition_rows[u][stop] for u, score in zip(previous, previous_scores)]
+    last = max(range(len(final)), key=final.__getitem__)
+    path = [kept_tags[-1][last]]
+    for w in range(n - 1, 0, -1):
+        last = backpointers[w - 1][last]
+        path.append(kept_tags[w - 1][last])
+    path.reverse()
+    return path, cells
+
+
+def segmented_viterbi(transition_rows, columns, span_ids, memo):
+    """Exact Viterbi that splits the sentence at positions with a single candidate tag.
+
+    Under a first-order HMM such an anchor fixes the path through it, so the
+    best path is the concatenation of the best paths of the spans between
+    anchors, each decoded from its left anchor tag (or START) to its right
+    anchor tag (or STOP).  Spans are memoized in ``memo`` under
+    ``(left tag, span_ids[i:j], right tag)``; ``span_ids`` must identify the
+    columns, e.g. the word ids they were looked up from.
+
+    Returns ``(path, spans, memo hits, lattice cells scored)``; memoized
+    spans cost no cells.
+    """
+    n = len(columns)
+    start, stop = len(transition_rows) - 2, len(transition_rows) - 1
+    path = []
+    left, first = start, 0
+    spans = hits = cells = 0
+    for position in range(n + 1):
+        if position < n and len(columns[position][0]) != 1:
+            continue
+        right = columns[position][0][0] if position < n else stop
+        if position > first:
+            key = (left, tuple(span_ids[first:position]), right)
+            span = memo.get(key)
+            if span is None:
+                span, span_cells = pruned_viterbi_cells(transition_rows, columns[first:position],
+                                                        start=left, stop=right)
+                memo[key] = span
+                cells += span_cells
+            else:
+                hits += 1
+            spans += 1
+            path.extend(span)
+        if position < n:
+            path.append(right)
+        left, first = right, position + 1
+    return path, spans, hits, cells
@@ -0,0 +1,57 @@
+"""NumPy-free view of a saved model for fast start-up.
+
+``LiteModel.load`` maps the artifact with ``artifact.read_views`` and
+decodes with the pure-Python ``pruned_viterbi`` over each word's
+tag-dictionary entry.  Tags a word was never seen with have zero emission
+probability, so this is exactly ``HMMModel.decode``; it only skips the
+~100 ms NumPy import, which dominates tagging a small file from the shell.
+"""
+from hmm_tagger.artifact import check_source, read_views
+from hmm_tagger.lattice import pruned_viterbi
+from hmm_tagger.vocab import Vocabulary
+
+
+class LiteModel:
+
+    def __init__(self, tags, vocab, transition_rows, indptr, indices, data, meta=None):
+        self.tags = list(tags)
+        self.vocab = vocab
+        self.transition_rows = transition_rows
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.meta = meta or {}
+        self._columns = {}
+
+    @classmethod
+    def load(cls, path, train_path=None):
+        """Map a saved model; with ``train_path`` raise ``StaleModelError`` if it changed."""
+        meta, views = read_views(path)
+        if "kind" in meta:
+            raise ValueError(f"{path} is a {meta['kind']} artifact, not a first-order model")
+        if train_path is not None:
+            check_source(meta, train_path, path)
+        tags = meta.pop("tags")
+        vocab = Vocabulary(views["word_blob"], views["word_offsets"], views["word_slots"])
+        return cls(tags, vocab, views["log_transition"].tolist(), views["emission_indptr"],
+                   views["emission_indices"], views["emission_data"], meta)
+
+    @property
+    def unk_id(self):
+        return len(self.indptr) - 2
+
+    def _column(self, word_id):
+        column = self._columns.get(word_id)
+        if column is None:
+            start, end = self.indptr[word_id], self.indptr[word_id + 1]
+            column = self._columns[word_id] = (self.indices[start:end].tolist(), self.data[start:end].tolist())
+        return column
+
+    def decode(self, words):
+        """Return the Viterbi tag sequence for a list of tokens."""
+        unk_id = self.unk_id
+        columns = [self._column(self.vocab.get(word, unk_id)) for word in words]
+        return [self.tags[i] for i in pruned_viterbi(self.transition_rows, columns)]
+
+    def decode_batch(self, sentences):
+        return [self.decode(words) for words in sentences]
@@ -0,0 +1,159 @@
+"""Load generator and end-to-end self-test for the tagging service.
+
+``--concurrency`` clients each keep one connection open and send requests
+back to back until ``--requests`` have been made; the report gives latency
+percentiles and throughput.  ``--self-test`` starts a server on a free
+localhost port (or a temporary Unix socket with ``--unix``), runs the load
+against it and checks every reply against the in-process decoders.
+
+Usage::
+
+    python -m hmm_tagger.loadgen --port 8080 --language ES --input Data/ES/dev.in
+    python -m hmm_tagger.loadgen --self-test --data Data --languages ES RU
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from hmm_tagger.client import ServiceError, TagClient
+from hmm_tagger.conll import read_sentences
+from hmm_tagger.server import MAX_BATCH, MAX_LATENCY, TaggingServer, load_models
+
+
+def percentile(values, q):
+    """Nearest-rank ``q``-th percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+def request_sentences(sentences, index, per_request):
+    """The sentences of request ``index``, cycling through ``sentences``."""
+    return [sentences[(index * per_request + i) % len(sentences)] for i in range(per_request)]
+
+
+async def run_load(connect, language, sentences, concurrency=32, requests=2000, per_request=1, k=None):
+    """Send ``requests`` tag requests over ``concurrency`` connections.
+
+    ``connect`` returns a new ``TagClient``.  Returns the report and the
+    replies in request order.
+    """
+    replies = [None] * requests
+    latencies = []
+    next_index = iter(range(requests))
+
+    async def worker():
+        async with connect() as client:
+            for index in next_index:
+                batch = request_sentences(sentences, index, per_request)
+                start = time.perf_counter()
+                replies[index] = await client.tag(language, batch, k)
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    tokens = sum(len(words) for index in range(requests)
+                 for words in request_sentences(sentences, index, per_request))
+    report = {
+        "language": language,
+        "k": k,
+        "concurrency": concurrency,
+        "requests": requests,
+        "sentences_per_request": per_request,
+        "seconds": seconds,
+        "requests_per_second": requests / seconds,
+        "tokens_per_second": tokens / seconds,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+    return report, replies
+
+
+async def self_test(data_dir, languages, concurrency, requests, per_request, use_unix,
+                    max_batch=MAX_BATCH, max_latency=MAX_LATENCY):
+    """Serve ``languages`` on localhost, load it and compare replies with direct decoding."""
+    models = load_models(data_dir, languages)
+    server = TaggingServer(models, max_batch, max_latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tagger.sock") if use_unix else None
+        listener = await server.start("127.0.0.1", 0, path)
+        port = None if use_unix else listener.sockets[0].getsockname()[1]
+
+        def connect():
+            return TagClient("127.0.0.1", port, path)
+
+        reports, failures = [], []
+        try:
+            for language in languages:
+                sentences = list(read_sentences(os.path.join(data_dir, language, "dev.in")))
+                model = models[language]
+                for k in (None, 2):
+                    report, replies = await run_load(connect, language, sentences, concurrency,
+                                                     requests, per_request, k)
+                    reports.append(report)
+                    for index, reply in enumerate(replies):
+                        for words, result in zip(request_sentences(sentences, index, per_request), reply):
+                            expected = model.decode(words) if k is None else model.k_best(words, k)
+                            if result != expected:
+                                failures.append(f"{language} k={k} request {index}: {words}")
+            async with connect() as client:
+                try:
+                    await client.tag("XX", [["hola"]])
+                    failures.append("unknown language was accepted")
+                except ServiceError as error:
+                    if error.status != 404:
+                        failures.append(f"unknown language gave status {error.status}")
+                stats = await client.stats()
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            server.close()
+    return reports, stats, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate load against the tagging service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", nargs="?", const="", help="use a Unix socket (path, or a temporary one with --self-test)")
+    parser.add_argument("--language", default="ES")
+    parser.add_argument("--input", help="untagged sentences to send (default: DATA/LANGUAGE/dev.in)")
+    parser.add_argument("--data", default="Data")
+    parser.add_argument("--languages", nargs="+", default=["ES", "RU"], help="languages for --self-test")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sentences-per-request", type=int, default=1)
+    parser.add_argument("-k", type=int, help="request the k best paths with scores")
+    parser.add_argument("--self-test", action="store_true", help="start a server on localhost and verify replies")
+    args = parser.parse_args(argv)
+
+    if args.self_test:
+        reports, stats, failures = asyncio.run(self_test(
+            args.data, args.languages, args.concurrency, args.requests, args.sentences_per_request,
+            args.unix is not None))
+        for report in reports:
+            print(json.dumps(report))
+        print(json.dumps(stats))
+        for failure in failures:
+            print(f"MISMATCH {failure}", file=sys.stderr)
+        print("self-test " + ("failed" if failures else "passed"), file=sys.stderr)
+        return 1 if failures else 0
+
+    input_path = args.input or os.path.join(args.data, args.language, "dev.in")
+    sentences = list(read_sentences(input_path))
+    report, _ = asyncio.run(run_load(
+        lambda: TagClient(args.host, args.port, args.unix or None), args.language, sentences,
+        args.concurrency, args.requests, args.sentences_per_request, args.k))
+    print(json.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
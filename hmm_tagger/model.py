@@ -0,0 +1,348 @@
+"""Log-probability tables of a trained first-order HMM."""
+import itertools
+import os
+
+import numpy as np
+
+from hmm_tagger import instrument
+from hmm_tagger.artifact import VERSION, StaleModelError, check_source, file_hash, read_artifact, write_artifact
+from hmm_tagger.counts import HMMCounts, START, STOP
+from hmm_tagger.emission import SparseEmissions
+from hmm_tagger.lattice import pruned_viterbi_cells, segmented_viterbi
+from hmm_tagger.posterior import forward_backward
+from hmm_tagger.precision import get_precision
+from hmm_tagger.viterbi import k_best_viterbi, viterbi, viterbi_batch
+from hmm_tagger.vocab import Vocabulary
+
+# Probability used for transitions never seen in training, as in the Task scripts
+FLOOR = 1e-10
+# Spans kept by decode_segmented before its memo is reset
+SPAN_MEMO_SIZE = 100000
+
+# Distinguishes in-memory models that have no training file hash
+_anonymous = itertools.count()
+
+
+def safe_log(probabilities, floor=FLOOR):
+    """Log of ``probabilities`` with zeros replaced by ``floor``."""
+    return np.log(np.where(probabilities > 0, probabilities, floor))
+
+
+class HMMModel:
+    """Dense log-space parameters ready for decoding.
+
+    ``emissions`` is a sparse table with one row per training word followed by
+    the ``#UNK#`` row, which unknown words map to.  ``meta`` records how the model
+    was built (smoothing ``k``, ``floor`` and the training file hash) and,
+    unless it is float64, the ``precision`` the tables are stored at (see
+    ``hmm_tagger.precision``); ``with_precision`` converts between them.
+
+    ``tag_counts`` are the training counts of each tag, which
+    ``tag_dictionary`` needs to recover word x tag counts; models saved
+    before they were stored have ``None``.
+
+    An optional ``DecodeCache`` set with ``use_cache`` serves repeated
+    sentences in ``decode``, ``decode_batch`` and ``k_best``.
+    """
+
+    def __init__(self, tags, vocab, log_transition, emissions, meta=None, tag_counts=None):
+        self.tags = list(tags)
+        self.vocab = vocab
+        self.log_transition = log_transition
+        self.emissions = emissions
+        self.tag_counts = tag_counts
+        self.meta = meta or {}
+        self.precision = get_precision(self.meta.get("precision"))
+        self.cache = None
+        self._derived = {}
+
+    @classmethod
+    def from_counts(cls, counts, k=1, floor=FLOOR, unk="tag"):
+        """Estimate from ``counts`` with emission smoothing ``k``, transition ``floor``
+        and one of ``UNK_STRATEGIES`` for the ``#UNK#`` row."""
+        with instrument.stage("estimate"):
+            return cls._from_counts(counts, k, floor, unk)
+
+    @classmethod
+    def _from_counts(cls, counts, k, floor, unk_strategy="tag"):
+        meta = {"k": k, "floor": floor}
+        if unk_strategy != "tag":
+            meta["unk"] = unk_strategy
+        emissions, unk = counts.emission_probabilities(k, unk_strategy)
+        transitions = counts.transition_probabilities()
+        tags, words = counts.tags, counts.words
+        tag_counts = counts.tag_counts.astype(np.float64)
+        # Tags and words whose counts were all subtracted away are left out
+        live_tags = np.flatnonzero(counts.tag_counts)
+        live_words = np.flatnonzero(counts.emission_counts.any(axis=1))
+        if len(live_tags) < len(tags) or len(live_words) < len(words):
+            states = np.append(live_tags, [len(tags), len(tags) + 1])
+            transitions = transitions[np.ix_(states, states)]
+            emissions = emissions[np.ix_(live_words, live_tags)]
+            unk = unk[live_tags]
+            tag_counts = tag_counts[live_tags]
+            tags = [tags[i] for i in live_tags]
+            words = [words[i] for i in live_words]
+        return cls(tags, Vocabulary.from_words(words), safe_log(transitions, floor),
+                   SparseEmissions.from_probabilities(emissions, unk), meta, tag_counts)
+
+    @classmethod
+    def from_file(cls, path, k=1, floor=FLOOR, unk="tag", cached=False):
+        model = cls.from_counts(HMMCounts.from_file(path, cached), k, floor, unk)
+        model.meta.update(source=os.path.basename(path), source_sha256=file_hash(path))
+        return model
+
+    def with_precision(self, precision):
+        """Return this model with its log-probability tables stored at another precision."""
+        precision = get_precision(precision)
+        if precision is self.precision:
+            return self
+        meta = {key: value for key, value in self.meta.items() if key not in ("precision", "scale")}
+        if precision.name != "float64":
+            meta.update(precision=precision.name, scale=precision.scale)
+        log_transition = precision.quantize(self.precision.dequantize(self.log_transition))
+        return HMMModel(self.tags, self.vocab, log_transition, self.emissions.with_precision(precision), meta,
+                        self.tag_counts)
+
+    def save(self, path, precision=None):
+        """Write the model artifact, converted to ``precision`` first if one is given."""
+        if precision is not None and get_precision(precision) is not self.precision:
+            return self.with_precision(precision).save(path)
+        arrays = {"log_transition": self.log_transition}
+        if self.tag_counts is not None:
+            arrays["tag_counts"] = self.tag_counts
+        arrays.update(self.emissions.to_arrays())
+        arrays.update(self.vocab.to_arrays())
+        write_artifact(path, arrays, dict(self.meta, tags=self.tags))
+
+    @classmethod
+    def load(cls, path, train_path=None, mmap=True):
+        """Load a saved model; with ``train_path`` raise ``StaleModelError`` if it changed."""
+        meta, arrays = read_artifact(path, mmap)
+        if "kind" in meta:
+            raise ValueError(f"{path} is a {meta['kind']} artifact, not a first-order model")
+        if train_path is not None:
+            check_source(meta, train_path, path)
+        precision = get_precision(meta.get("precision"))
+        if meta.get("scale") != precision.scale:
+            raise StaleModelError(f"{path} stores {precision.name} at scale {meta.get('scale')}, "
+                                  f"expected {precision.scale}")
+        tags = meta.pop("tags")
+        vocab = Vocabulary(arrays["word_blob"], arrays["word_offsets"], arrays["word_slots"])
+        emissions = SparseEmissions.from_arrays(arrays, len(tags), precision)
+        return cls(tags, vocab, arrays["log_transition"], emissions, meta, arrays.get("tag_counts"))
+
+    @classmethod
+    def load_or_train(cls, train_path, model_path, k=1, floor=FLOOR, unk="tag", precision="float64"):
+        """Load ``model_path`` if it is up to date with ``train_path`` and was trained with
+        these options, otherwise retrain and save."""
+        if os.path.exists(model_path):
+            try:
+                model = cls.load(model_path, train_path)
+                options = (model.meta.get("k"), model.meta.get("floor"), model.meta.get("unk", "tag"),
+                           model.precision.name)
+                if options == (k, floor, unk, get_precision(precision).name):
+                    return model
+            except ValueError:
+                pass
+        model = cls.from_file(train_path, k, floor, unk).with_precision(precision)
+        model.save(model_path)
+        return model
+
+    @property
+    def num_tags(self):
+        return len(self.tags)
+
+    @property
+    def states(self):
+        """Tag names in transition-matrix order, START and STOP last."""
+        return self.tags + [START, STOP]
+
+    @property
+    def fingerprint(self):
+        """Identifies the parameters: artifact version, training file hash, smoothing options and precision."""
+        if "fingerprint" not in self._derived:
+            source = self.meta.get("source_sha256") or f"anonymous-{os.getpid()}-{next(_anonymous)}"
+            self._derived["fingerprint"] = (self.meta.get("version", VERSION), source,
+                                            self.meta.get("k"), self.meta.get("floor"), self.meta.get("unk"),
+                                            self.precision.name)
+        return self._derived["fingerprint"]
+
+    def use_cache(self, cache):
+        """Serve repeated sentences from ``cache`` (a ``DecodeCache``, or ``None`` to stop)."""
+        if cache is not None:
+            cache.bind(self.fingerprint)
+        self.cache = cache
+        return self
+
+    def _cached(self, word_ids, k=None):
+        key = self.cache.key(word_ids, k)
+        value = self.cache.get(key)
+        if instrument.stats is not None:
+            instrument.stats.count(cache_hits=value is not None, cache_misses=value is None)
+        return key, value
+
+    def word_ids(self, words):
+        return self.vocab.lookup(words, self.emissions.unk_id)
+
+    def emission_slice(self, words):
+        return self.emissions.dense(self.word_ids(words))
+
+    def decode(self, words):
+        """Return the Viterbi tag sequence for a list of tokens."""
+        word_ids = self.word_ids(words)
+        if self.cache is not None:
+            key, path = self._cached(word_ids)
+            if path is not None:
+                if instrument.stats is not None:
+                    instrument.stats.record_decode(self, word_ids, [path], cells=0)
+                return [self.tags[i] for i in path]
+        with instrument.stage("decode"):
+            path = viterbi(self._decode_transition(), self.emissions.dense(word_ids), self.precision.saturate)
+        if instrument.stats is not None:
+            instrument.stats.record_decode(self, word_ids, [path])
+        if self.cache is not None:
+            self.cache.put(key, tuple(path))
+        return [self.tags[i] for i in path]
+
+    def decode_batch(self, sentences, batch_size=None):
+        """Return the Viterbi tag sequences of many sentences, in input order.
+
+        By default fewer sentences share a batch the more tags there are (see ``viterbi_batch``).
+        """
+        word_ids = [self.word_ids(words) for words in sentences]
+        if self.cache is None:
+            paths = self._decode_batch(word_ids, batch_size)
+        else:
+            keys, paths = zip(*[self._cached(ids) for ids in word_ids]) if word_ids else ((), ())
+            # Each distinct uncached sentence is decoded once
+            missing = {}
+            for i, (key, path) in enumerate(zip(keys, paths)):
+                if path is None:
+                    missing.setdefault(key, i)
+            decoded = self._decode_batch([word_ids[i] for i in missing.values()], batch_size)
+            decoded = dict(zip(missing, decoded))
+            for key, path in decoded.items():
+                self.cache.put(key, tuple(path))
+            paths = [decoded[key] if path is None else path for key, path in zip(keys, paths)]
+            if instrument.stats is not None:
+                # Cache hits and repeats within the batch are counted without lattice work
+                decoded_at = set(missing.values())
+                for i, ids in enumerate(word_ids):
+                    if i not in decoded_at:
+                        instrument.stats.record_decode(self, ids, [paths[i]], cells=0)
+        return [[self.tags[i] for i in path] for path in paths]
+
+    def _decode_batch(self, word_ids, batch_size):
+        with instrument.stage("decode"):
+            emissions = [self.emissions.dense(ids) for ids in word_ids]
+            paths = viterbi_batch(self._decode_transition(), emissions, batch_size, self.precision.saturate)
+        if instrument.stats is not None:
+            for ids, path in zip(word_ids, paths):
+                instrument.stats.record_decode(self, ids, [path])
+        return paths
+
+    def k_best(self, words, k):
+        """Return up to ``k`` (log score, tags) pairs for a sentence, best first.
+
+        Scores are natural-log probabilities at every precision.
+        """
+        word_ids = self.word_ids(words)
+        ranked = None
+        if self.cache is not None:
+            key, ranked = self._cached(word_ids, k)
+            if ranked is not None and instrument.stats is not None:
+                instrument.stats.record_decode(self, word_ids, [path for _, path in ranked], cells=0)
+        if ranked is None:
+            with instrument.stage("decode"):
+                ranked = k_best_viterbi(self._decode_transition(), self.emissions.dense(word_ids), k,
+                                        self.precision.saturate)
+                if self.precision.quantized:
+                    ranked = [(score / self.precision.scale, path) for score, path in ranked]
+            if instrument.stats is not None:
+                candidates = max(len(words) - 1, 0) * self.num_tags * k * self.num_tags
+                instrument.stats.record_decode(self, word_ids, [path for _, path in ranked], candidates)
+            if self.cache is not None:
+                self.cache.put(key, tuple((score, tuple(path)) for score, path in ranked))
+        return [(score, [self.tags[i] for i in path]) for score, path in ranked]
+
+    def marginals(self, words):
+        """Return the (n, T) posterior tag probabilities of a sentence and its log-likelihood."""
+        word_ids = self.word_ids(words)
+        with instrument.stage("posterior"):
+            return forward_backward(self.precision.dequantize(self.log_transition),
+                                    self.precision.dequantize(self.emissions.dense(word_ids)))
+
+    def confidences(self, words):
+        """Return the Viterbi tags with the posterior probability of each chosen tag."""
+        tags = self.decode(words)
+        posteriors, _ = self.marginals(words)
+        tag_index = {tag: i for i, tag in enumerate(self.tags)}
+        ids = [tag_index[tag] for tag in tags]
+        return tags, posteriors[np.arange(len(ids)), ids].tolist()
+
+    def tag_dictionary(self, min_share=0.0):
+        """Per-word candidate tags as list-backed CSR ``(indptr, tags, log-probs)``.
+
+        Known words keep only the tags they were seen with, minus those seen
+        less than ``min_share`` of the time; ``#UNK#`` keeps every tag.
+        """
+        key = ("tag_dictionary", min_share)
+        if key not in self._derived:
+            emissions = self.emissions
+            if min_share:
+                if self.tag_counts is None and self.meta.get("unk", "tag") != "tag":
+                    raise ValueError("min_share needs the tag counts, which this model was saved without")
+                emissions = emissions.restricted(min_share, self.meta.get("k", 1), self.tag_counts)
+            self._derived[key] = (emissions.indptr.tolist(), emissions.indices.tolist(),
+                                  emissions.data.tolist())
+        return self._derived[key]
+
+    def decode_pruned(self, words, beam=None, threshold=None, min_share=0.0):
+        """Viterbi restricted to each word's tag-dictionary entries, optionally beam-pruned.
+
+        Unknown words keep every tag.  ``beam`` and ``threshold`` prune
+        states per position (see ``pruned_viterbi``); ``threshold`` is in nats.
+        """
+        word_ids = self.word_ids(words)
+        if threshold is not None and self.precision.quantized:
+            threshold *= self.precision.scale
+        with instrument.stage("decode"):
+            path, cells = pruned_viterbi_cells(self._transition_rows(), self._columns(word_ids, min_share),
+                                               beam, threshold)
+        if instrument.stats is not None:
+            instrument.stats.record_decode(self, word_ids, [path], cells=cells)
+        return [self.tags[i] for i in path]
+
+    def decode_segmented(self, words, min_share=0.0):
+        """Exact ``decode_pruned`` that splits sentences at single-candidate anchor tokens.
+
+        Spans between anchors are decoded independently and memoized, so
+        repeated phrases between the same anchor tags are decoded once.
+        """
+        word_ids = self.word_ids(words)
+        memo = self._derived.setdefault(("span_memo", min_share), {})
+        if len(memo) > SPAN_MEMO_SIZE:
+            memo.clear()
+        with instrument.stage("decode"):
+            ids = word_ids.tolist()
+            path, spans, hits, cells = segmented_viterbi(self._transition_rows(),
+                                                         self._columns(word_ids, min_share), ids, memo)
+        if instrument.stats is not None:
+            instrument.stats.record_decode(self, word_ids, [path], cells=cells)
+            instrument.stats.count(spans=spans, span_memo_hits=hits)
+        return [self.tags[i] for i in path]
+
+    def _decode_transition(self):
+        if "decode_transition" not in self._derived:
+            self._derived["decode_transition"] = self.precision.widen(self.log_transition)
+        return self._derived["decode_transition"]
+
+    def _transition_rows(self):
+        if "transition_rows" not in self._derived:
+            self._derived["transition_rows"] = self._decode_transition().tolist()
+        return self._derived["transition_rows"]
+
+    def _columns(self, word_ids, min_share):
+        indptr, tags, data = self.tag_dictionary(min_share)
+        return [(tags[indptr[i]:indptr[i + 1]], data[indptr[i]:indptr[i + 1]]) for i in word_ids.tolist()]
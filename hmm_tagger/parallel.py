@@ -0,0 +1,85 @@
+"""Multi-process tagging of large files.
+
+Every worker memory-maps the saved model artifact once in its initializer,
+so the matrices are shared through the page cache and never pickled per
+task.  With ``cache_bytes`` set each worker also keeps its own
+``DecodeCache`` of that size.  The parent streams chunks of sentences to the pool, keeps a bounded
+number of chunks in flight and yields results in input order.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from hmm_tagger.cache import DecodeCache
+from hmm_tagger.conll import TaggedWriter, chunks, read_sentences
+from hmm_tagger.model import HMMModel
+
+CHUNK_SIZE = 512
+
+_model = None
+
+
+def _init_worker(model_path, cache_bytes=None):
+    global _model
+    _model = HMMModel.load(model_path)
+    if cache_bytes:
+        _model.use_cache(DecodeCache(cache_bytes))
+
+
+def _decode_chunk(sentences, k):
+    if k is None:
+        return _model.decode_batch(sentences)
+    return [_model.k_best(words, k) for words in sentences]
+
+
+def kth_tags(ranked, rank, length, default="O"):
+    """Tags of the ``rank``-th best path (1-based), or all ``default`` if there are fewer."""
+    if rank <= len(ranked):
+        return ranked[rank - 1][1]
+    return [default] * length
+
+
+def parallel_decode(model_path, sentences, workers=None, k=None, chunk_size=CHUNK_SIZE, cache_bytes=None):
+    """Yield ``(tokens, result)`` per sentence, in input order.
+
+    ``result`` is the tag list, or the k-best list when ``k`` is set.  With
+    ``workers=1`` everything runs in the calling process.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(model_path, cache_bytes)
+        for chunk in chunks(sentences, chunk_size):
+            yield from zip(chunk, _decode_chunk(chunk, k))
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_path, cache_bytes)) as pool:
+        pending = deque()
+        for chunk in chunks(sentences, chunk_size):
+            pending.append((chunk, pool.submit(_decode_chunk, chunk, k)))
+            if len(pending) >= 2 * workers:
+                chunk, future = pending.popleft()
+                yield from zip(chunk, future.result())
+        while pending:
+            chunk, future = pending.popleft()
+            yield from zip(chunk, future.result())
+
+
+def parallel_tag_file(model_path, in_path, out_path, workers=None, chunk_size=CHUNK_SIZE, cache_bytes=None):
+    """Viterbi-tag ``in_path`` into ``out_path`` using a pool of ``workers`` processes."""
+    results = parallel_decode(model_path, read_sentences(in_path), workers, None, chunk_size, cache_bytes)
+    with TaggedWriter(out_path) as writer:
+        for words, tags in results:
+            writer.write(words, tags)
+
+
+def parallel_kbest_file(model_path, in_path, out_paths, k, workers=None, chunk_size=CHUNK_SIZE,
+                        cache_bytes=None):
+    """Write the ranked paths named in ``out_paths`` (rank -> path) from one k-best decode."""
+    results = parallel_decode(model_path, read_sentences(in_path), workers, k, chunk_size, cache_bytes)
+    writers = {rank: TaggedWriter(path) for rank, path in out_paths.items()}
+    try:
+        for words, ranked in results:
+            for rank, writer in writers.items():
+                writer.write(words, kth_tags(ranked, rank, len(words)))
+    finally:
+        for writer in writers.values():
+            writer.close()
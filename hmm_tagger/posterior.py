@@ -0,0 +1,96 @@
+"""Scaled forward-backward over the decoder's dense tables.
+
+The recursions run in probability space on ``exp`` of the log tables, and
+every forward column is normalised to sum to one, so long sentences never
+underflow.  With scales ``c_t`` and the STOP mass ``z`` of the last column,
+``log P(sentence) = sum(log c_t) + log z``.  Posteriors and expected counts
+come out of the scaled quantities directly.
+
+Sentences of equal length are stacked and run as one (batch x T) recursion.
+"""
+import numpy as np
+
+
+def _group(transition, start, stop, emission):
+    """Forward-backward for a (batch, n, T) emission stack.
+
+    Returns the posteriors (batch, n, T), the expected transition counts
+    summed over the stack (T, T) and the log-likelihood of each sentence.
+    """
+    size, n, num_tags = emission.shape
+    alpha = np.empty_like(emission)
+    scales = np.empty((size, n))
+    column = start * emission[:, 0]
+    for t in range(n):
+        if t:
+            column = (alpha[:, t - 1] @ transition) * emission[:, t]
+        scales[:, t] = column.sum(axis=1)
+        alpha[:, t] = column / np.where(scales[:, t] > 0, scales[:, t], 1.0)[:, None]
+    end = alpha[:, n - 1] @ stop
+    possible = (end > 0) & (scales > 0).all(axis=1)
+    end = np.where(possible, end, 1.0)
+
+    beta = np.empty_like(emission)
+    beta[:, n - 1] = stop / end[:, None]
+    for t in range(n - 2, -1, -1):
+        after = emission[:, t + 1] * beta[:, t + 1] / np.where(scales[:, t + 1] > 0, scales[:, t + 1], 1.0)[:, None]
+        beta[:, t] = after @ transition.T
+    beta[~possible] = 0.0
+
+    posteriors = alpha * beta
+    if n > 1:
+        after = emission[:, 1:] * beta[:, 1:] / np.where(scales[:, 1:] > 0, scales[:, 1:], 1.0)[:, :, None]
+        pairs = alpha[:, :-1].reshape(-1, num_tags).T @ after.reshape(-1, num_tags)
+        expected_transitions = transition * pairs
+    else:
+        expected_transitions = np.zeros((num_tags, num_tags))
+    with np.errstate(divide="ignore"):
+        log_likelihood = np.where(possible, np.log(scales).sum(axis=1) + np.log(end), -np.inf)
+    return posteriors, expected_transitions, log_likelihood
+
+
+def _tables(log_transition, num_tags):
+    probabilities = np.exp(log_transition)
+    return (probabilities[:num_tags, :num_tags], probabilities[num_tags, :num_tags],
+            probabilities[:num_tags, num_tags + 1])
+
+
+def forward_backward(log_transition, log_emission):
+    """Return the (n, T) posterior tag marginals and the log-likelihood of one sentence."""
+    n, num_tags = log_emission.shape
+    if n == 0:
+        return np.zeros((0, num_tags)), 0.0
+    transition, start, stop = _tables(log_transition, num_tags)
+    posteriors, _, log_likelihood = _group(transition, start, stop, np.exp(log_emission)[None])
+    return posteriors[0], float(log_likelihood[0])
+
+
+class ExpectedCounts:
+    """Expected START, transition, STOP and per-token tag counts of a batch of sentences."""
+
+    def __init__(self, log_transition, log_emissions):
+        num_tags = len(log_transition) - 2
+        transition, start, stop = _tables(log_transition, num_tags)
+        self.posteriors = [None] * len(log_emissions)
+        self.start = np.zeros(num_tags)
+        self.stop = np.zeros(num_tags)
+        self.transitions = np.zeros((num_tags, num_tags))
+        self.log_likelihood = 0.0
+        self.impossible = 0
+        by_length = {}
+        for i, log_emission in enumerate(log_emissions):
+            if len(log_emission):
+                by_length.setdefault(len(log_emission), []).append(i)
+            else:
+                self.posteriors[i] = np.zeros((0, num_tags))
+        for group in by_length.values():
+            emission = np.exp(np.stack([log_emissions[i] for i in group]))
+            posteriors, transitions, log_likelihood = _group(transition, start, stop, emission)
+            possible = np.isfinite(log_likelihood)
+            self.start += posteriors[:, 0].sum(axis=0)
+            self.stop += posteriors[:, -1].sum(axis=0)
+            self.transitions += transitions
+            self.log_likelihood += float(log_likelihood[possible].sum())
+            self.impossible += int((~possible).sum())
+            for row, i in enumerate(group):
+                self.posteriors[i] = posteriors[row]
@@ -0,0 +1,191 @@
+"""Storage precision of a model's log-probability tables.
+
+``float64`` is what training produces.  ``float32`` halves the tables and
+decodes in single precision.  ``int32`` and ``int16`` store fixed-point
+log-probabilities, ``round(log p * scale)``, and decode in a wider integer
+accumulator (int64 and int32), so argmax decoding never touches floats:
+
+* every finite log-probability, including the transition ``floor``, stays
+  a finite value clipped to the storage range, so the ranking of paths
+  through unseen transitions is kept;
+* ``-inf`` (a tag a known word was never seen with) becomes ``impossible``,
+  a large negative accumulator value, and decoders clip sums to it, so an
+  impossible path saturates there instead of overflowing.
+
+Paths can differ from ``float64`` only where two scores are closer than the
+rounding error; ``python -m hmm_tagger.precision Data/ES Data/RU -k 8``
+measures how often that happens, with the memory and speed of each mode.
+Lower-ranked k-best paths are often exact or near ties, so their order
+changes far more often than the best path does.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from hmm_tagger.conll import read_sentences, read_tagged_sentences
+from hmm_tagger.evaluate import score
+
+
+class Precision:
+    """One storage mode: table dtype, decoding dtype and fixed-point ``scale`` (None for floats)."""
+
+    def __init__(self, name, dtype, accumulator, scale=None):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.accumulator = np.dtype(accumulator)
+        self.scale = scale
+        if scale is None:
+            self.impossible = -np.inf
+            self.saturate = None
+        else:
+            # Sums of three impossible values still fit in the accumulator
+            self.impossible = self.saturate = np.iinfo(self.accumulator).min // 4
+
+    @property
+    def quantized(self):
+        return self.scale is not None
+
+    def __repr__(self):
+        return f"Precision({self.name!r})"
+
+    def quantize(self, log_probs):
+        """Convert float log-probabilities to the storage dtype."""
+        log_probs = np.asarray(log_probs, dtype=np.float64)
+        if not self.quantized:
+            return log_probs.astype(self.dtype)
+        info = np.iinfo(self.dtype)
+        # The storage minimum is reserved for -inf
+        values = np.clip(np.rint(log_probs * self.scale), info.min + 1, info.max)
+        return np.where(np.isneginf(log_probs), info.min, values).astype(self.dtype)
+
+    def dequantize(self, values):
+        """Convert stored (or accumulated) values back to float64 log-probabilities."""
+        values = np.asarray(values)
+        if not self.quantized:
+            return values.astype(np.float64)
+        if values.dtype == self.dtype:
+            impossible = values == np.iinfo(self.dtype).min
+        else:
+            impossible = values <= self.impossible
+        return np.where(impossible, -np.inf, values / self.scale)
+
+    def widen(self, values):
+        """Convert stored values to the decoding dtype, mapping the storage minimum to ``impossible``."""
+        values = np.asarray(values)
+        if not self.quantized:
+            return values.astype(self.accumulator, copy=False)
+        # Widen first: ``impossible`` does not fit in the storage dtype
+        widened = values.astype(self.accumulator)
+        widened[values == np.iinfo(self.dtype).min] = self.impossible
+        return widened
+
+
+PRECISIONS = {
+    "float64": Precision("float64", np.float64, np.float64),
+    "float32": Precision("float32", np.float32, np.float32),
+    # 2**-16 nats per step; log-probs down to -32768 nats
+    "int32": Precision("int32", np.int32, np.int64, 1 << 16),
+    # 1/1000 nat per step; log-probs below -32.767 nats (p < 6e-15) are clipped
+    "int16": Precision("int16", np.int16, np.int32, 1000),
+}
+
+
+def get_precision(name):
+    if isinstance(name, Precision):
+        return name
+    try:
+        return PRECISIONS[name or "float64"]
+    except KeyError:
+        raise ValueError(f"unknown precision {name!r}, expected one of {', '.join(PRECISIONS)}") from None
+
+
+def table_bytes(model):
+    """Bytes of the transition table and emission log-probs (the arrays decoding reads)."""
+    return int(np.asarray(model.log_transition).nbytes + np.asarray(model.emissions.data).nbytes)
+
+
+def artifact_bytes(model):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "model.hmm")
+        model.save(path)
+        return os.path.getsize(path)
+
+
+def _timed_decode(model, sentences, repeat):
+    best, paths = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        paths = model.decode_batch(sentences)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return paths, best
+
+
+def precision_report(model, sentences, gold=None, names=tuple(PRECISIONS), repeat=3, k=None):
+    """Decode ``sentences`` at every precision; report path changes against ``model``'s own.
+
+    ``model`` should be the float64 model.  Decode times are the best of
+    ``repeat`` ``decode_batch`` runs.  With ``k``, sentences whose ranked
+    k-best list changed are counted too.
+    """
+    sentences = list(sentences)
+    gold = list(gold) if gold is not None else None
+    reference, reference_seconds = _timed_decode(model, sentences, repeat)
+    tokens = sum(map(len, sentences))
+    if k:
+        reference_ranked = [[path for _, path in model.k_best(words, k)] for words in sentences]
+    reports = []
+    for name in names:
+        converted = model.with_precision(name)
+        paths, seconds = _timed_decode(converted, sentences, repeat)
+        changed_tokens = sum(a != b for x, y in zip(reference, paths) for a, b in zip(x, y))
+        report = {
+            "precision": name,
+            "sentences": len(sentences),
+            "tokens": tokens,
+            "changed_sentences": sum(x != y for x, y in zip(reference, paths)),
+            "changed_tokens": changed_tokens,
+            "changed_token_rate": changed_tokens / tokens if tokens else 0.0,
+            "table_bytes": table_bytes(converted),
+            "artifact_bytes": artifact_bytes(converted),
+            "decode_seconds": seconds,
+            "speedup": reference_seconds / seconds if seconds else None,
+        }
+        if k:
+            ranked = [[path for _, path in converted.k_best(words, k)] for words in sentences]
+            report["kbest_changed_sentences"] = sum(x != y for x, y in zip(reference_ranked, ranked))
+        if gold is not None:
+            report["f1"] = score(gold, paths).sentiment[2]
+        reports.append(report)
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare decoding at each table precision with float64.")
+    parser.add_argument("data_dirs", nargs="+", help="directories with train, dev.in and dev.out")
+    parser.add_argument("--precisions", nargs="+", choices=list(PRECISIONS), default=list(PRECISIONS))
+    parser.add_argument("--repeat", type=int, default=3, help="decode runs per mode, the fastest is kept")
+    parser.add_argument("-k", type=int, help="also compare the k-best lists")
+    args = parser.parse_args(argv)
+
+    from hmm_tagger.model import HMMModel
+
+    for data_dir in args.data_dirs:
+        model = HMMModel.from_file(os.path.join(data_dir, "train"))
+        gold_path = os.path.join(data_dir, "dev.out")
+        gold = ([tags for _, tags in read_tagged_sentences(gold_path)]
+                if os.path.exists(gold_path) else None)
+        reports = precision_report(model, read_sentences(os.path.join(data_dir, "dev.in")), gold,
+                                   args.precisions, args.repeat, args.k)
+        for report in reports:
+            print(json.dumps(dict(report, data=data_dir)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Measure what pruned decoding changes compared with exact Viterbi.
+
+Usage::
+
+    python -m hmm_tagger.prune Data/ES --beam 2 --min-share 0.1
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from hmm_tagger.conll import read_sentences, read_tagged_sentences
+from hmm_tagger.evaluate import score
+from hmm_tagger.model import HMMModel
+
+
+def pruning_report(model, sentences, gold=None, beam=None, threshold=None, min_share=0.0):
+    """Decode ``sentences`` exactly and pruned; return agreement, timing and optional F1.
+
+    Anchor-segmented decoding is timed too; ``segmented_changed_sentences``
+    counts disagreements with unpruned decoding under the same ``min_share``
+    and should always be 0.
+    """
+    sentences = list(sentences)
+    model.decode_pruned(sentences[0] if sentences else [], beam, threshold, min_share)  # build tables
+
+    start = time.perf_counter()
+    exact = [model.decode(words) for words in sentences]
+    exact_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    pruned = [model.decode_pruned(words, beam, threshold, min_share) for words in sentences]
+    pruned_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    segmented = [model.decode_segmented(words, min_share) for words in sentences]
+    segmented_seconds = time.perf_counter() - start
+    if beam is None and threshold is None:
+        constrained = pruned
+    else:
+        constrained = [model.decode_pruned(words, min_share=min_share) for words in sentences]
+
+    tokens = sum(map(len, sentences))
+    changed_tokens = sum(a != b for x, y in zip(exact, pruned) for a, b in zip(x, y))
+    report = {
+        "options": {"beam": beam, "threshold": threshold, "min_share": min_share},
+        "sentences": len(sentences),
+        "tokens": tokens,
+        "changed_sentences": sum(x != y for x, y in zip(exact, pruned)),
+        "changed_tokens": changed_tokens,
+        "changed_token_rate": changed_tokens / tokens if tokens else 0.0,
+        "exact_seconds": exact_seconds,
+        "pruned_seconds": pruned_seconds,
+        "speedup": exact_seconds / pruned_seconds if pruned_seconds else None,
+        "segmented_seconds": segmented_seconds,
+        "segmented_changed_sentences": sum(x != y for x, y in zip(constrained, segmented)),
+    }
+    if gold is not None:
+        gold = list(gold)
+        report["exact_f1"] = score(gold, exact).sentiment[2]
+        report["pruned_f1"] = score(gold, pruned).sentiment[2]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare pruned decoding with exact Viterbi.")
+    parser.add_argument("data_dirs", nargs="+", help="directories with train, dev.in and dev.out")
+    parser.add_argument("--beam", type=int)
+    parser.add_argument("--threshold", type=float)
+    parser.add_argument("--min-share", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    for data_dir in args.data_dirs:
+        model = HMMModel.from_file(os.path.join(data_dir, "train"))
+        gold = (tags for _, tags in read_tagged_sentences(os.path.join(data_dir, "dev.out")))
+        report = pruning_report(model, read_sentences(os.path.join(data_dir, "dev.in")), gold,
+                                args.beam, args.threshold, args.min_share)
+        print(json.dumps(dict(report, data=data_dir)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""Registry of named models loaded lazily from a directory of artifacts.
+
+``ModelRegistry(directory)`` serves ``directory/<name>.hmm`` as model
+``name`` (``pattern`` changes the layout, e.g. ``{name}/train.hmm`` for
+``Data/ES/train.hmm``).  Nothing is read until a model is first asked for.
+
+* Shared structures: models with the same tag list share one list of
+  interned tag strings, and models whose word tables are byte-identical
+  (variants trained on one corpus with other smoothing or precision)
+  share one ``Vocabulary``, so the token string pool is mapped once.
+* Memory budget: a model costs its decoding tables, its decode cache and
+  any word table no other loaded model shares.  Past ``max_bytes`` the
+  least recently used models are dropped and reloaded on demand.
+* Hot reload: each lookup compares the artifact's size, mtime and inode
+  with those it was loaded from and loads the new file when they differ.
+  Callers keep the model object they were given, so a batch being tagged
+  finishes on the old parameters; ``write_artifact`` replaces files
+  atomically, so the old mapping stays valid.  The new model gets its own
+  decode cache, seeded with the old one's paths only if its fingerprint is
+  unchanged.  A file that fails to load leaves the previous model in
+  service.
+
+Lookups may come from several threads.
+"""
+import glob
+import hashlib
+import os
+import re
+import struct
+import sys
+import threading
+from collections import OrderedDict
+
+from hmm_tagger.cache import DecodeCache
+from hmm_tagger.model import HMMModel
+
+PATTERN = "{name}.hmm"
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def _table_bytes(model):
+    emissions = model.emissions
+    return int(model.log_transition.nbytes + emissions.indptr.nbytes
+               + emissions.indices.nbytes + emissions.data.nbytes)
+
+
+def _vocab_bytes(vocab):
+    return int(vocab.blob.nbytes + vocab.offsets.nbytes + vocab.slots.nbytes)
+
+
+class _Entry:
+
+    def __init__(self, model, path=None, stamp=None):
+        self.model = model
+        self.path = path
+        self.stamp = stamp
+        self.failed_stamp = None
+
+    @property
+    def pinned(self):
+        return self.path is None
+
+
+class ModelRegistry:
+    """Name -> ``HMMModel`` map that loads, shares, evicts and reloads models."""
+
+    def __init__(self, directory=None, pattern=PATTERN, max_bytes=None, cache_bytes=0):
+        self.directory = directory
+        self.pattern = pattern
+        self.max_bytes = max_bytes
+        self.cache_bytes = cache_bytes
+        self.entries = OrderedDict()
+        self.tag_sets = {}
+        self.vocabularies = {}
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.failed_loads = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_models(cls, models):
+        """Wrap already-built models; they are never evicted or reloaded."""
+        registry = cls()
+        for name, model in models.items():
+            registry.add(name, model)
+        return registry
+
+    def path(self, name):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, self.pattern.format(name=name))
+
+    def names(self):
+        """Names of the pinned models and of every artifact matching the pattern."""
+        names = {name for name, entry in self.entries.items() if entry.pinned}
+        if self.directory is not None:
+            prefix, _, suffix = self.pattern.partition("{name}")
+            matcher = re.compile(re.escape(os.path.join(self.directory, prefix)) + "(.+)" + re.escape(suffix) + "$")
+            for path in glob.glob(os.path.join(glob.escape(self.directory), prefix + "*" + suffix)):
+                match = matcher.match(path)
+                if match and os.sep not in match.group(1):
+                    names.add(match.group(1))
+        return sorted(names)
+
+    def __contains__(self, name):
+        if not isinstance(name, str):
+            return False
+        if name in self.entries:
+            return True
+        path = self.path(name)
+        return path is not None and os.sep not in name and os.path.isfile(path)
+
+    def add(self, name, model):
+        """Register an in-memory model under ``name``, pinned."""
+        with self._lock:
+            self.entries[name] = _Entry(self._share(model))
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def get(self, name):
+        """Return model ``name``, loading or reloading it if needed; ``KeyError`` if there is none."""
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                path = self.path(name)
+                if path is None or os.sep in name or not os.path.isfile(path):
+                    raise KeyError(name)
+                entry = self._load(name, path)
+                if entry is None:
+                    raise KeyError(name)
+            elif not entry.pinned:
+                stamp = _stamp(entry.path)
+                if stamp is not None and stamp != entry.stamp and stamp != entry.failed_stamp:
+                    entry = self._load(name, entry.path, entry) or entry
+            self.entries.move_to_end(name)
+            self._evict(keep=name)
+            return entry.model
+
+    def _load(self, name, path, old=None):
+        stamp = _stamp(path)
+        try:
+            model = HMMModel.load(path)
+        except (OSError, ValueError, struct.error) as error:
+            self.failed_loads += 1
+            print(f"registry: cannot load {path}: {error}", file=sys.stderr)
+            if old is not None:
+                old.failed_stamp = stamp
+            return None
+        model = self._share(model)
+        cache = DecodeCache(self.cache_bytes) if self.cache_bytes else None
+        if old is None:
+            self.loads += 1
+        else:
+            # The old model may still be decoding into its own cache, so the new
+            # model gets a copy of it, and only when the parameters are unchanged
+            previous = old.model.cache
+            if cache is not None and previous is not None and previous.version == model.fingerprint:
+                try:
+                    cache = previous.copy()
+                except RuntimeError:
+                    pass  # changed by an in-flight decode while copying; start empty
+            self.reloads += 1
+        model.use_cache(cache)
+        entry = self.entries[name] = _Entry(model, path, stamp)
+        self._prune_pools()
+        return entry
+
+    def _share(self, model):
+        tags = tuple(model.tags)
+        shared = self.tag_sets.get(tags)
+        if shared is None:
+            shared = self.tag_sets[tags] = [sys.intern(tag) for tag in tags]
+        model.tags = shared
+        vocab = model.vocab
+        digest = hashlib.sha256()
+        for array in (vocab.offsets, vocab.blob):
+            digest.update(memoryview(array).cast("B"))
+        model.vocab = self.vocabularies.setdefault(digest.hexdigest(), vocab)
+        return model
+
+    def _prune_pools(self):
+        models = [entry.model for entry in self.entries.values()]
+        used_tags = {id(model.tags) for model in models}
+        used_vocabs = {id(model.vocab) for model in models}
+        self.tag_sets = {key: tags for key, tags in self.tag_sets.items() if id(tags) in used_tags}
+        self.vocabularies = {key: vocab for key, vocab in self.vocabularies.items() if id(vocab) in used_vocabs}
+
+    def resident_bytes(self):
+        """Estimated bytes of the loaded models, counting each shared word table once."""
+        with self._lock:
+            total = 0
+            vocabs = {}
+            for entry in self.entries.values():
+                model = entry.model
+                total += _table_bytes(model)
+                if model.cache is not None:
+                    total += model.cache.max_bytes
+                vocabs[id(model.vocab)] = model.vocab
+            return total + sum(_vocab_bytes(vocab) for vocab in vocabs.values())
+
+    def _evict(self, keep=None):
+        if self.max_bytes is None:
+            return
+        while self.resident_bytes() > self.max_bytes:
+            victim = next((name for name, entry in self.entries.items()
+                           if not entry.pinned and name != keep), None)
+            if victim is None:
+                break
+            del self.entries[victim]
+            self.evictions += 1
+            self._prune_pools()
+
+    def loaded(self):
+        """Snapshot of the loaded models, least recently used first."""
+        with self._lock:
+            return {name: entry.model for name, entry in self.entries.items()}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": list(self.entries),
+                "resident_bytes": self.resident_bytes(),
+                "max_bytes": self.max_bytes,
+                "shared_tag_sets": len(self.tag_sets),
+                "shared_vocabularies": len(self.vocabularies),
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "failed_loads": self.failed_loads,
+            }
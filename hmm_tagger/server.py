@@ -0,0 +1,296 @@
+"""Asyncio tagging service over HTTP, on a TCP port or a Unix socket.
+
+Models come from a ``ModelRegistry``: either built at start-up from
+``Data/<language>/train`` or, with ``--models DIR``, loaded on first use
+from the artifacts in ``DIR``, evicted past ``--max-model-bytes`` and
+reloaded when their file changes.  Each batch is decoded with the model
+current when it starts.  Requests for the same language and
+``k`` are coalesced into micro-batches: a batch is decoded as soon as it
+holds ``max_batch`` sentences or its first request has waited
+``max_latency`` seconds.  Decoding runs on a single worker thread so the
+event loop keeps accepting connections meanwhile.
+
+Endpoints::
+
+    POST /tag     {"language": "ES", "sentences": [["Muy", "bueno"], "Muy bueno"], "k": 2}
+    GET  /health  available and loaded languages
+    GET  /stats   batching, decode-cache and registry statistics
+
+``k`` is limited to ``--max-k``; decoding errors are answered with a 500.
+Without ``k`` the reply is ``{"tags": [[...], ...]}``; with ``k`` it is
+``{"kbest": [[{"score": ..., "tags": [...]}, ...], ...]}`` per sentence.
+
+Usage::
+
+    python -m hmm_tagger.server --data Data --languages ES RU --port 8080
+    python -m hmm_tagger.server --models models/ --max-model-bytes 500000000 --port 8080
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from hmm_tagger.cache import DecodeCache
+from hmm_tagger.model import HMMModel
+from hmm_tagger.registry import PATTERN, ModelRegistry
+
+MAX_BATCH = 64
+MAX_LATENCY = 0.005
+MAX_BODY = 16 << 20
+# k-best decoding holds n * T * k scores per sentence, and every k gets its own batcher
+MAX_K = 100
+
+
+class RequestError(Exception):
+    """A client error, answered with ``status`` and a JSON error message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """Collects concurrent submissions and decodes them as one batch."""
+
+    def __init__(self, decode_many, executor, max_batch=MAX_BATCH, max_latency=MAX_LATENCY):
+        self.decode_many = decode_many
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.sentences = 0
+
+    async def submit(self, sentences):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((sentences, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        items = [await self.queue.get()]
+        size = len(items[0][0])
+        deadline = loop.time() + self.max_latency
+        while size < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            sentences = [words for batch, _ in items for words in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.decode_many, sentences)
+            except Exception as error:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.batches += 1
+            self.sentences += len(sentences)
+            offset = 0
+            for batch, future in items:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(batch)])
+                offset += len(batch)
+
+
+class TaggingServer:
+    """Routes HTTP requests to per-(language, k) micro-batchers.
+
+    ``models`` is a ``ModelRegistry`` or a dict of models, which is wrapped
+    in one.
+    """
+
+    def __init__(self, models, max_batch=MAX_BATCH, max_latency=MAX_LATENCY, max_k=MAX_K):
+        if not isinstance(models, ModelRegistry):
+            models = ModelRegistry.from_models(models)
+        self.models = models
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.max_k = max_k
+        self.executor = ThreadPoolExecutor(1)
+        self.batchers = {}
+        self.tasks = []
+
+    def _batcher(self, language, k):
+        batcher = self.batchers.get((language, k))
+        if batcher is None:
+            models = self.models
+
+            # Runs on the decode thread, so a lazy load or reload does not block the event loop
+            def decode_many(sentences):
+                model = models[language]
+                if k is None:
+                    return model.decode_batch(sentences)
+                return [model.k_best(words, k) for words in sentences]
+            batcher = self.batchers[language, k] = MicroBatcher(
+                decode_many, self.executor, self.max_batch, self.max_latency)
+            self.tasks.append(asyncio.get_running_loop().create_task(batcher.run()))
+        return batcher
+
+    async def start(self, host="127.0.0.1", port=8080, path=None):
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        for task in self.tasks:
+            task.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def tag(self, payload):
+        if not isinstance(payload, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "body must be a JSON object")
+        language = payload.get("language")
+        if language not in self.models:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"no model for language {language!r}")
+        sentences = payload.get("sentences")
+        if not isinstance(sentences, list):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "sentences must be a list")
+        sentences = [words.split() if isinstance(words, str) else words for words in sentences]
+        if not all(isinstance(words, list) and all(isinstance(w, str) for w in words) for words in sentences):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "each sentence must be a string or a list of tokens")
+        k = payload.get("k")
+        if k is not None and (not isinstance(k, int) or isinstance(k, bool) or k < 1):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "k must be a positive integer")
+        if k is not None and k > self.max_k:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"k must be at most {self.max_k}")
+        try:
+            results = await self._batcher(language, k).submit(sentences)
+        except KeyError:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"no model for language {language!r}") from None
+        if k is None:
+            return {"tags": results}
+        return {"kbest": [[{"score": score, "tags": tags} for score, tags in ranked] for ranked in results]}
+
+    def stats(self):
+        return {
+            "batching": {f"{language}/k={k}": {"batches": b.batches, "sentences": b.sentences}
+                         for (language, k), b in self.batchers.items()},
+            "cache": {language: model.cache.as_dict()
+                      for language, model in self.models.loaded().items() if model.cache is not None},
+            "registry": self.models.stats(),
+        }
+
+    async def route(self, method, target, body):
+        if target == "/tag" and method == "POST":
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                raise RequestError(HTTPStatus.BAD_REQUEST, "body is not valid JSON")
+            return await self.tag(payload)
+        if target == "/health" and method == "GET":
+            return {"status": "ok", "languages": self.models.names(), "loaded": sorted(self.models.loaded())}
+        if target == "/stats" and method == "GET":
+            return self.stats()
+        raise RequestError(HTTPStatus.NOT_FOUND, f"no route for {method} {target}")
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                try:
+                    if length > MAX_BODY:
+                        raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request body too large")
+                    body = await reader.readexactly(length)
+                    status, payload = HTTPStatus.OK, await self.route(method, target, body)
+                except RequestError as error:
+                    status, payload = error.status, {"error": str(error)}
+                except asyncio.IncompleteReadError:
+                    raise
+                except Exception as error:
+                    # A failed decode still gets a reply instead of a dropped connection
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = {"error": f"{type(error).__name__}: {error}"}
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                             + data)
+                await writer.drain()
+                if not keep_alive or length > MAX_BODY:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def load_models(data_dir, languages, cache_bytes=None):
+    """Load (training first if needed) ``data_dir/<language>/train.hmm`` for each language."""
+    models = {}
+    for language in languages:
+        train_path = os.path.join(data_dir, language, "train")
+        models[language] = HMMModel.load_or_train(train_path, train_path + ".hmm")
+        if cache_bytes:
+            models[language].use_cache(DecodeCache(cache_bytes))
+    return models
+
+
+async def serve(models, host="127.0.0.1", port=8080, path=None, max_batch=MAX_BATCH, max_latency=MAX_LATENCY,
+                max_k=MAX_K):
+    server = TaggingServer(models, max_batch, max_latency, max_k)
+    listener = await server.start(host, port, path)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the HMM taggers over HTTP.")
+    parser.add_argument("--data", default="Data")
+    parser.add_argument("--languages", nargs="+", default=["ES", "RU"])
+    parser.add_argument("--models", help="serve the artifacts in this directory, loaded on first use")
+    parser.add_argument("--pattern", default=PATTERN, help="artifact path of model {name} under --models")
+    parser.add_argument("--max-model-bytes", type=int, help="evict least recently used models past this")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-latency-ms", type=float, default=MAX_LATENCY * 1000)
+    parser.add_argument("--cache-bytes", type=int, default=0)
+    parser.add_argument("--max-k", type=int, default=MAX_K, help="largest k a request may ask for")
+    args = parser.parse_args(argv)
+    if args.models is not None:
+        models = ModelRegistry(args.models, args.pattern, args.max_model_bytes, args.cache_bytes)
+    else:
+        models = load_models(args.data, args.languages, args.cache_bytes)
+    try:
+        asyncio.run(serve(models, args.host, args.port, args.unix, args.max_batch, args.max_latency_ms / 1000,
+                          args.max_k))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Cross-validated sweep over the smoothing options.
+
+The training file is read through its binary corpus cache (see
+``corpus``), so it is parsed at most once.  Full-corpus counts and the
+counts of each fold are built from the id arrays, and the training counts
+of fold ``f`` are the full counts minus those of fold ``f``.  Each
+(fold, k) task estimates the emissions once for its ``k`` and decodes the
+held-out sentences for every ``#UNK#`` strategy and transition floor;
+scores are pooled over folds.
+
+Usage::
+
+    python -m hmm_tagger.sweep Data/RU/train --folds 5 -k 0.1 0.5 1 2 5 --unk tag total --floors 1e-10 1e-6
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from hmm_tagger.corpus import load_corpus
+from hmm_tagger.counts import UNK_STRATEGIES, HMMCounts
+from hmm_tagger.evaluate import EntityScore, score
+from hmm_tagger.model import FLOOR, HMMModel
+
+K_VALUES = (0.1, 0.5, 1, 2, 5)
+FLOORS = (FLOOR, 1e-6)
+
+_state = None
+
+
+def split_folds(corpus, folds):
+    """Return ``(counts, held-out sentences)`` per fold; sentence ``i`` goes to fold ``i % folds``."""
+    result = []
+    for fold in range(folds):
+        sentence_ids = np.arange(fold, len(corpus), folds)
+        result.append((HMMCounts.from_corpus(corpus, sentence_ids), list(corpus.sentences(sentence_ids))))
+    return result
+
+
+def _init_worker(full, folds):
+    global _state
+    _state = full, folds
+
+
+def _evaluate(fold, k, unks, floors):
+    full, folds = _state
+    fold_counts, held_out = folds[fold]
+    counts = full.copy().subtract(fold_counts)
+    sentences = [words for words, _ in held_out]
+    gold = [tags for _, tags in held_out]
+    scores = {}
+    for unk in unks:
+        for floor in floors:
+            model = HMMModel.from_counts(counts, k, floor, unk)
+            scores[k, unk, floor] = score(gold, model.decode_batch(sentences))
+    return fold, scores
+
+
+def sweep(train_path, folds=5, ks=K_VALUES, unks=UNK_STRATEGIES, floors=FLOORS, workers=None):
+    """Cross-validate every (k, #UNK# strategy, floor) combination.
+
+    Returns one dict per configuration, best pooled sentiment F1 first.
+    """
+    corpus = load_corpus(train_path)
+    full = HMMCounts.from_corpus(corpus)
+    fold_data = split_folds(corpus, folds)
+    tasks = [(fold, k) for fold in range(folds) for k in ks]
+    pooled = {}
+    per_fold = {}
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(full, fold_data)
+        results = (_evaluate(fold, k, unks, floors) for fold, k in tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(full, fold_data))
+        futures = [pool.submit(_evaluate, fold, k, unks, floors) for fold, k in tasks]
+        results = (future.result() for future in futures)
+    try:
+        for fold, scores in results:
+            for config, result in scores.items():
+                pooled.setdefault(config, EntityScore()).merge(result)
+                per_fold.setdefault(config, [None] * folds)[fold] = result.sentiment[2]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    rows = []
+    for (k, unk, floor), result in pooled.items():
+        rows.append({"k": k, "unk": unk, "floor": floor,
+                     "entity_f1": result.entity[2], "sentiment_f1": result.sentiment[2],
+                     "fold_sentiment_f1": per_fold[k, unk, floor]})
+    rows.sort(key=lambda row: (-row["sentiment_f1"], -row["entity_f1"]))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-validate smoothing options on a training file.")
+    parser.add_argument("train")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("-k", type=float, nargs="+", default=list(K_VALUES))
+    parser.add_argument("--unk", nargs="+", choices=UNK_STRATEGIES, default=list(UNK_STRATEGIES))
+    parser.add_argument("--floors", type=float, nargs="+", default=list(FLOORS))
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = sweep(args.train, args.folds, args.k, args.unk, args.floors, args.workers)
+    seconds = time.perf_counter() - start
+    print(f"{'k':>6} {'unk':>6} {'floor':>8} {'entity F':>9} {'sentiment F':>12}")
+    for row in rows:
+        print(f"{row['k']:>6g} {row['unk']:>6} {row['floor']:>8.0e} {row['entity_f1']:>9.4f} {row['sentiment_f1']:>12.4f}")
+    print(f"{len(rows)} configurations x {args.folds} folds in {seconds:.2f} s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"train": args.train, "folds": args.folds, "seconds": seconds, "rows": rows}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
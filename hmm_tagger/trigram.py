@@ -0,0 +1,293 @@
+"""Second-order (trigram) HMM with interpolated transitions.
+
+P(v | t, u) = l3 * c(t, u, v) / c(t, u) + l2 * c(u, v) / c(u) + l1 * c(v) / N
+
+with the lambdas set by deleted interpolation (Brants, 2000) unless given.
+Emissions are the first-order ones from ``HMMCounts``.
+
+The decoder runs over (previous, current) tag-pair states, but only over
+pairs seen as bigrams in training (plus (START, v)).  Pair-to-pair
+transitions are stored as a sparse edge list sorted by target, so a step
+costs one gather and one segmented max over the observed edges instead of
+T^3 work.  A sentence can then have no path at all, e.g. two adjacent
+words each seen with one tag whose bigram never occurred in training; such
+sentences are decoded with the first-order transitions (floored like
+``HMMModel``'s) that the model keeps for this.
+
+Models are saved in the artifact format with ``kind="trigram"``
+(``python -m hmm_tagger train --order 2``).  Scoring against the bigram
+model on the dev sets::
+
+    python -m hmm_tagger.trigram Data/ES Data/RU
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from hmm_tagger import instrument
+from hmm_tagger.artifact import check_source, file_hash, read_artifact, write_artifact
+from hmm_tagger.conll import read_sentences, read_tagged_sentences
+from hmm_tagger.counts import HMMCounts, read_tagged_file
+from hmm_tagger.emission import SparseEmissions
+from hmm_tagger.evaluate import score
+from hmm_tagger.model import FLOOR, safe_log
+from hmm_tagger.viterbi import viterbi
+from hmm_tagger.vocab import Vocabulary
+
+KIND = "trigram"
+
+
+def trigram_counts(tags, lengths, num_tags):
+    """Return sorted trigram codes and their counts over START START ... STOP padded sentences.
+
+    ``tags`` are tag ids; a trigram (t, u, v) is coded as ``(t * S + u) * S + v``
+    with ``S = num_tags + 2``, START = ``num_tags`` and STOP = ``num_tags + 1``.
+    """
+    size = num_tags + 2
+    start, stop = num_tags, num_tags + 1
+    ends = np.cumsum(lengths)
+    padded_length = np.asarray(lengths) + 3
+    states = np.empty(int(padded_length.sum()), dtype=np.int64)
+    padded_ends = np.cumsum(padded_length)
+    padded_starts = padded_ends - padded_length
+    states[padded_starts] = start
+    states[padded_starts + 1] = start
+    states[padded_ends - 1] = stop
+    body = np.ones(len(states), dtype=bool)
+    body[padded_starts] = body[padded_starts + 1] = body[padded_ends - 1] = False
+    states[body] = tags[:int(ends[-1])] if len(ends) else tags
+    codes = (states[:-2] * size + states[1:-1]) * size + states[2:]
+    # Drop windows that straddle two sentences
+    valid = np.ones(len(codes), dtype=bool)
+    valid[padded_ends[:-1] - 2] = valid[padded_ends[:-1] - 1] = False
+    return np.unique(codes[valid], return_counts=True)
+
+
+def deleted_interpolation(keys, counts, bigrams, unigrams, total):
+    """Brants' deleted interpolation weights (l1, l2, l3) for the trigram counts."""
+    size = len(unigrams)
+    t, rest = np.divmod(keys, size * size)
+    u, v = np.divmod(rest, size)
+    history = _history(t, u, bigrams, unigrams)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.stack([
+            np.where(total > 1, (unigrams[v] - 1) / (total - 1), 0.0),
+            np.where(unigrams[u] > 1, (bigrams[u, v] - 1) / (unigrams[u] - 1), 0.0),
+            np.where(history > 1, (counts - 1) / (history - 1), 0.0),
+        ])
+    weights = np.bincount(scores.argmax(axis=0), weights=counts, minlength=3)
+    return weights / weights.sum()
+
+
+def _history(t, u, bigrams, unigrams):
+    """c(t, u), where the (START, START) history occurs once per sentence."""
+    start = len(unigrams) - 2
+    return np.where((t == start) & (u == start), unigrams[start], bigrams[t, u])
+
+
+class TrigramModel:
+    """Tag-pair states, their sparse transition edges and first-order emissions.
+
+    ``pairs[i]`` is the (previous, current) tag id pair of state ``i`` with
+    START = T.  Edge ``j`` goes from ``sources[j]`` to ``targets[j]`` with
+    log-prob ``edge_scores[j]``; edges are sorted by target.
+    ``first_order`` is the (T + 2) x (T + 2) fallback transition table.
+    """
+
+    def __init__(self, tags, vocab, emissions, pairs, edges, start_scores, stop_scores, first_order,
+                 lambdas, meta=None):
+        self.tags = list(tags)
+        self.vocab = vocab
+        self.emissions = emissions
+        self.pairs = pairs
+        self.sources, self.targets, self.edge_scores = edges
+        self.start_scores = start_scores
+        self.stop_scores = stop_scores
+        self.first_order = first_order
+        self.lambdas = lambdas
+        self.meta = meta or {}
+        self.segment_starts = np.flatnonzero(np.r_[True, self.targets[1:] != self.targets[:-1]])
+        self.segment_lengths = np.diff(np.r_[self.segment_starts, len(self.targets)])
+        self.segment_targets = self.targets[self.segment_starts]
+        self.segment_ids = np.repeat(np.arange(len(self.segment_starts)), self.segment_lengths)
+
+    @classmethod
+    def from_file(cls, path, k=1, lambdas=None):
+        with instrument.stage("parse"):
+            words, tags, lengths = read_tagged_file(path)
+        model = cls.from_sequences(words, tags, lengths, k, lambdas)
+        model.meta.update(source=os.path.basename(path), source_sha256=file_hash(path))
+        return model
+
+    @classmethod
+    def from_sequences(cls, words, tags, lengths, k=1, lambdas=None):
+        with instrument.stage("count"):
+            counts = HMMCounts.from_sequences(words, tags, lengths)
+            tag_ids = np.array([counts.tag_index[tag] for tag in tags], dtype=np.int64)
+            keys, key_counts = trigram_counts(tag_ids, lengths, counts.num_tags)
+        with instrument.stage("estimate"):
+            return cls.from_counts(counts, keys, key_counts, k, lambdas)
+
+    @classmethod
+    def from_counts(cls, counts, keys, key_counts, k=1, lambdas=None):
+        num_tags = counts.num_tags
+        size = num_tags + 2
+        start, stop = num_tags, num_tags + 1
+        bigrams = counts.transition_matrix()
+        sentences = counts.start_counts.sum()
+        unigrams = np.zeros(size, dtype=np.int64)
+        unigrams[:num_tags] = counts.tag_counts
+        unigrams[start] = unigrams[stop] = sentences
+        total = unigrams.sum() - sentences  # START is never predicted
+        if lambdas is None:
+            lambdas = deleted_interpolation(keys, key_counts, bigrams, unigrams, total)
+        l1, l2, l3 = lambdas
+
+        def log_prob(t, u, v):
+            codes = (t * size + u) * size + v
+            found = np.minimum(np.searchsorted(keys, codes), len(keys) - 1)
+            trigram = np.where(keys[found] == codes, key_counts[found], 0)
+            history = _history(t, u, bigrams, unigrams)
+            p = (l3 * np.divide(trigram, history, out=np.zeros(len(codes)), where=history > 0)
+                 + l2 * bigrams[u, v] / unigrams[u]
+                 + l1 * unigrams[v] / total)
+            with np.errstate(divide="ignore"):
+                return np.log(p)
+
+        # Pair states: every bigram seen in training that ends in a real tag
+        previous, current = np.nonzero(bigrams[:stop, :num_tags])
+        pairs = np.stack([previous, current], axis=1)
+        pair_of = {(t, u): i for i, (t, u) in enumerate(pairs.tolist())}
+        edges = []
+        for target, (u, v) in enumerate(pairs.tolist()):
+            if u != start:
+                edges.extend((pair_of[(t, u)], target, t)
+                             for t in range(start + 1) if (t, u) in pair_of)
+        edges.sort(key=lambda edge: edge[1])
+        sources, targets, t = np.array(edges, dtype=np.int64).reshape(-1, 3).T
+        u, v = pairs[targets, 0], pairs[targets, 1]
+        first = np.flatnonzero(pairs[:, 0] == start)
+        start_scores = np.full(len(pairs), -np.inf)
+        start_scores[first] = log_prob(np.full(len(first), start), pairs[first, 0], pairs[first, 1])
+        stop_scores = log_prob(pairs[:, 0], pairs[:, 1], np.full(len(pairs), stop))
+        emissions = SparseEmissions.from_probabilities(*counts.emission_probabilities(k))
+        return cls(counts.tags, Vocabulary.from_words(counts.words), emissions, pairs,
+                   (sources, targets, log_prob(t, u, v)), start_scores, stop_scores,
+                   safe_log(counts.transition_probabilities(), FLOOR), tuple(float(x) for x in lambdas), {"k": k})
+
+    def save(self, path):
+        arrays = {"pairs": self.pairs, "edge_sources": self.sources, "edge_targets": self.targets,
+                  "edge_scores": self.edge_scores, "start_scores": self.start_scores,
+                  "stop_scores": self.stop_scores, "first_order_transition": self.first_order}
+        arrays.update(self.emissions.to_arrays())
+        arrays.update(self.vocab.to_arrays())
+        write_artifact(path, arrays, dict(self.meta, kind=KIND, tags=self.tags, lambdas=list(self.lambdas)))
+
+    @classmethod
+    def load(cls, path, train_path=None, mmap=True):
+        """Load a saved trigram model; with ``train_path`` raise ``StaleModelError`` if it changed."""
+        meta, arrays = read_artifact(path, mmap)
+        if meta.get("kind") != KIND:
+            raise ValueError(f"{path} is not a trigram model")
+        if train_path is not None:
+            check_source(meta, train_path, path)
+        tags = meta.pop("tags")
+        lambdas = tuple(meta.pop("lambdas"))
+        vocab = Vocabulary(arrays["word_blob"], arrays["word_offsets"], arrays["word_slots"])
+        edges = (arrays["edge_sources"], arrays["edge_targets"], arrays["edge_scores"])
+        return cls(tags, vocab, SparseEmissions.from_arrays(arrays, len(tags)), arrays["pairs"], edges,
+                   arrays["start_scores"], arrays["stop_scores"], arrays["first_order_transition"],
+                   lambdas, meta)
+
+    @property
+    def num_tags(self):
+        return len(self.tags)
+
+    def decode(self, words):
+        """Return the second-order Viterbi tag sequence for a list of tokens."""
+        return self.decode_scored(words)[1]
+
+    def decode_scored(self, words):
+        """Return ``(log score, tags)`` of the best second-order path.
+
+        For a sentence with no second-order path the tags and score are those
+        of the first-order fallback.
+        """
+        n = len(words)
+        if n == 0:
+            return 0.0, []
+        word_ids = self.vocab.lookup(words, self.emissions.unk_id)
+        with instrument.stage("decode"):
+            emission = self.emissions.dense(word_ids)
+            current_tag = self.pairs[:, 1]
+            score = self.start_scores + emission[0, current_tag]
+            backpointers = np.zeros((n, len(self.pairs)), dtype=np.int32)
+            for w in range(1, n):
+                candidates = score[self.sources] + self.edge_scores
+                best = np.maximum.reduceat(candidates, self.segment_starts)
+                # First source reaching each target's maximum, as argmax would pick
+                hits = np.flatnonzero(candidates == np.repeat(best, self.segment_lengths))
+                first = hits[np.r_[True, self.segment_ids[hits[1:]] != self.segment_ids[hits[:-1]]]]
+                score = np.full(len(self.pairs), -np.inf)
+                score[self.segment_targets] = best + emission[w, current_tag[self.segment_targets]]
+                backpointers[w, self.segment_targets] = self.sources[first]
+            final = score + self.stop_scores
+            last = int(final.argmax())
+            best = float(final[last])
+            fallback = best == -np.inf
+            if fallback:
+                path = viterbi(self.first_order, emission)
+                states = [self.num_tags] + path + [self.num_tags + 1]
+                best = float(self.first_order[states[:-1], states[1:]].sum() + emission[np.arange(n), path].sum())
+            else:
+                path = [last]
+                for w in range(n - 1, 0, -1):
+                    last = int(backpointers[w, last])
+                    path.append(last)
+                path = current_tag[path[::-1]].tolist()
+        if instrument.stats is not None:
+            instrument.stats.count(sentences=1, tokens=n, lattice_cells=(n - 1) * len(self.sources),
+                                   first_order_fallbacks=int(fallback))
+        return best, [self.tags[i] for i in path]
+
+    def decode_batch(self, sentences):
+        return [self.decode(words) for words in sentences]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score the trigram model against the bigram model on dev sets.")
+    parser.add_argument("data_dirs", nargs="+", help="directories with train, dev.in and dev.out")
+    parser.add_argument("-k", type=float, default=1)
+    parser.add_argument("--lambdas", type=float, nargs=3, help="fixed (l1, l2, l3) instead of deleted interpolation")
+    args = parser.parse_args(argv)
+
+    from hmm_tagger.model import HMMModel
+
+    for data_dir in args.data_dirs:
+        train_path = os.path.join(data_dir, "train")
+        sentences = list(read_sentences(os.path.join(data_dir, "dev.in")))
+        gold = [tags for _, tags in read_tagged_sentences(os.path.join(data_dir, "dev.out"))]
+        report = {"data": data_dir}
+        predictions = {}
+        for name, build in (("bigram", lambda: HMMModel.from_file(train_path, args.k)),
+                            ("trigram", lambda: TrigramModel.from_file(train_path, args.k, args.lambdas))):
+            start = time.perf_counter()
+            model = build()
+            train_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            predicted = predictions[name] = [model.decode(words) for words in sentences]
+            result = score(gold, predicted)
+            report[name] = {"entity_f1": result.entity[2], "sentiment_f1": result.sentiment[2],
+                            "train_seconds": train_seconds, "decode_seconds": time.perf_counter() - start}
+        report["trigram"]["lambdas"] = list(model.lambdas)
+        report["changed_sentences"] = sum(a != b for a, b in zip(predictions["bigram"], predictions["trigram"]))
+        print(json.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
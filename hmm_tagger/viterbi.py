@@ -0,0 +1,145 @@
+"""Log-space Viterbi decoding over dense transition/emission matrices.
+
+``log_transition`` is the (T + 2) x (T + 2) table produced by
+``HMMModel`` with START at row T and STOP at column T + 1.  ``log_emission``
+is the (n, T) slice of emission log-probabilities for one sentence.
+
+Both may be fixed-point integers (see ``hmm_tagger.precision``); then
+``saturate`` is the precision's ``impossible`` value and every sum is
+clipped to it, so impossible paths cannot overflow the accumulator.
+"""
+import numpy as np
+
+# (batch x T x T) elements per batched step: past a few thousand the
+# candidate tensor outgrows the CPU caches and batching gets slower than
+# decoding sentence by sentence, so the batch shrinks as the tag set grows
+BATCH_CELLS = 8192
+
+
+def viterbi(log_transition, log_emission, saturate=None):
+    """Return the most likely tag id sequence for one sentence."""
+    n, num_tags = log_emission.shape
+    if n == 0:
+        return []
+    start, stop = num_tags, num_tags + 1
+    transition = log_transition[:num_tags, :num_tags]
+    columns = np.arange(num_tags)
+    backpointers = np.zeros((n, num_tags), dtype=np.int32)
+
+    score = log_transition[start, :num_tags] + log_emission[0]
+    for w in range(1, n):
+        candidates = score[:, None] + transition + log_emission[w]
+        if saturate is not None:
+            np.maximum(candidates, saturate, out=candidates)
+        best = candidates.argmax(axis=0)
+        backpointers[w] = best
+        score = candidates[best, columns]
+
+    last = int((score + log_transition[:num_tags, stop]).argmax())
+    path = [last]
+    for w in range(n - 1, 0, -1):
+        last = int(backpointers[w, last])
+        path.append(last)
+    path.reverse()
+    return path
+
+
+def viterbi_batch(log_transition, log_emissions, batch_size=None, saturate=None):
+    """Decode many sentences at once; returns tag id paths in input order.
+
+    Sentences are sorted by length and cut into batches of ``batch_size``
+    (by default as many as keep a step within ``BATCH_CELLS`` elements),
+    each padded to its longest sentence and run as a (batch x T x T) tensor.
+    Padded positions keep the previous score and an identity backpointer, so
+    every path is the same as ``viterbi`` would return for that sentence.
+    """
+    paths = [[] for _ in log_emissions]
+    order = sorted((i for i, e in enumerate(log_emissions) if len(e)),
+                   key=lambda i: len(log_emissions[i]))
+    if not order:
+        return paths
+    num_tags, dtype = log_emissions[order[0]].shape[1], log_emissions[order[0]].dtype
+    start, stop = num_tags, num_tags + 1
+    transition = log_transition[:num_tags, :num_tags]
+    columns = np.arange(num_tags)
+    if batch_size is None:
+        batch_size = max(1, BATCH_CELLS // (num_tags * num_tags))
+
+    for first in range(0, len(order), batch_size):
+        batch = order[first:first + batch_size]
+        lengths = np.array([len(log_emissions[i]) for i in batch])
+        size, longest = len(batch), int(lengths.max())
+        emission = np.zeros((size, longest, num_tags), dtype=dtype)
+        for row, i in enumerate(batch):
+            emission[row, :lengths[row]] = log_emissions[i]
+        backpointers = np.empty((size, longest, num_tags), dtype=np.int32)
+        backpointers[:] = columns
+
+        score = log_transition[start, :num_tags] + emission[:, 0]
+        for w in range(1, longest):
+            candidates = score[:, :, None] + transition + emission[:, w, None, :]
+            if saturate is not None:
+                np.maximum(candidates, saturate, out=candidates)
+            best = candidates.argmax(axis=1)
+            active = (w < lengths)[:, None]
+            backpointers[:, w] = np.where(active, best, columns)
+            score = np.where(active, np.take_along_axis(candidates, best[:, None, :], axis=1)[:, 0], score)
+
+        last = (score + log_transition[:num_tags, stop]).argmax(axis=1)
+        rows = np.arange(size)
+        best_paths = np.empty((size, longest), dtype=np.int32)
+        for w in range(longest - 1, 0, -1):
+            best_paths[:, w] = last
+            last = backpointers[rows, w, last]
+        best_paths[:, 0] = last
+        for row, i in enumerate(batch):
+            paths[i] = best_paths[row, :lengths[row]].tolist()
+    return paths
+
+
+def k_best_viterbi(log_transition, log_emission, k, saturate=None):
+    """Return up to ``k`` (log score, tag id path) pairs, best first.
+
+    Every lattice cell keeps the ``k`` best partial scores reaching that tag
+    together with a (previous tag, previous rank) backpointer, so a single
+    pass yields the whole ranked list.  Paths with probability zero are
+    dropped.
+    """
+    n, num_tags = log_emission.shape
+    if n == 0 or k < 1:
+        return []
+    start, stop = num_tags, num_tags + 1
+    transition = log_transition[:num_tags, :num_tags]
+    impossible = -np.inf if saturate is None else saturate
+    scores = np.full((n, num_tags, k), impossible, dtype=log_emission.dtype)
+    prev_tag = np.zeros((n, num_tags, k), dtype=np.int32)
+    prev_rank = np.zeros((n, num_tags, k), dtype=np.int32)
+
+    scores[0, :, 0] = log_transition[start, :num_tags] + log_emission[0]
+    for w in range(1, n):
+        # candidates[u * k + r, v]: extend the r-th best path ending in u with v
+        candidates = (scores[w - 1][:, :, None] + transition[:, None, :]
+                      + log_emission[w]).reshape(num_tags * k, num_tags)
+        if saturate is not None:
+            np.maximum(candidates, saturate, out=candidates)
+        top = np.argsort(-candidates, axis=0, kind="stable")[:k]
+        width = len(top)
+        scores[w, :, :width] = np.take_along_axis(candidates, top, axis=0).T
+        prev_tag[w, :, :width] = (top // k).T
+        prev_rank[w, :, :width] = (top % k).T
+
+    final = (scores[n - 1] + log_transition[:num_tags, stop, None]).ravel()
+    if saturate is not None:
+        np.maximum(final, saturate, out=final)
+    ranked = []
+    for cell in np.argsort(-final, kind="stable")[:k]:
+        if final[cell] <= impossible:
+            break
+        tag, rank = divmod(int(cell), k)
+        path = [tag]
+        for w in range(n - 1, 0, -1):
+            tag, rank = int(prev_tag[w, tag, rank]), int(prev_rank[w, tag, rank])
+            path.append(tag)
+        path.reverse()
+        ranked.append((float(final[cell]), path))
+    return ranked
@@ -0,0 +1,84 @@
+"""Compact word <-> id mapping stored as flat arrays.
+
+Words live in one UTF-8 ``blob`` with ``offsets[i]:offsets[i + 1]`` marking
+word ``i``.  Lookups go through ``slots``, an open-addressing hash table of
+word ids keyed by CRC-32 of the encoded word, so a vocabulary loaded from an
+artifact is usable straight from the memory map without building a dict.
+Lookups work on NumPy arrays and on plain ``memoryview``s alike; NumPy is
+only imported to build a vocabulary or for the array-returning ``lookup``.
+"""
+import zlib
+
+EMPTY = -1
+
+
+def _table_size(num_words):
+    size = 8
+    while size < 2 * num_words:
+        size *= 2
+    return size
+
+
+class Vocabulary:
+    """Interned word list; ids are positions in training (first-seen) order."""
+
+    def __init__(self, blob, offsets, slots):
+        self.blob = blob
+        self.offsets = offsets
+        self.slots = slots
+        self._data = memoryview(blob).cast("B")
+        self._mask = len(slots) - 1
+
+    @classmethod
+    def from_words(cls, words):
+        import numpy as np
+
+        encoded = [word.encode("utf-8") for word in words]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        slots = np.full(_table_size(len(encoded)), EMPTY, dtype=np.int32)
+        mask = len(slots) - 1
+        for word_id, word in enumerate(encoded):
+            slot = zlib.crc32(word) & mask
+            while slots[slot] != EMPTY:
+                slot = (slot + 1) & mask
+            slots[slot] = word_id
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(blob, offsets, slots)
+
+    def to_arrays(self):
+        return {"word_blob": self.blob, "word_offsets": self.offsets, "word_slots": self.slots}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, word_id):
+        return bytes(self._data[self.offsets[word_id]:self.offsets[word_id + 1]]).decode("utf-8")
+
+    @property
+    def words(self):
+        return [self[i] for i in range(len(self))]
+
+    def _find(self, encoded):
+        slots, data, offsets, mask = self.slots, self._data, self.offsets, self._mask
+        slot = zlib.crc32(encoded) & mask
+        while True:
+            word_id = int(slots[slot])
+            if word_id == EMPTY:
+                return None
+            if data[offsets[word_id]:offsets[word_id + 1]] == encoded:
+                return word_id
+            slot = (slot + 1) & mask
+
+    def __contains__(self, word):
+        return self._find(word.encode("utf-8")) is not None
+
+    def get(self, word, default=None):
+        word_id = self._find(word.encode("utf-8"))
+        return default if word_id is None else word_id
+
+    def lookup(self, words, default):
+        """Return the ids of ``words`` as an int64 array, ``default`` for unknown ones."""
+        import numpy as np
+
+        return np.fromiter((self.get(w, default) for w in words), dtype=np.int64, count=len(words))
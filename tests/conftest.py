@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from hmm_tagger.counts import HMMCounts
+from hmm_tagger.model import HMMModel
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Data")
+
+# Small enough to check by hand: ambiguous words ("good", "food", "bad"),
+# every tag at a sentence end and words seen with one tag only
+TAGGED = [
+    (["the", "food", "was", "great"], ["O", "B-positive", "O", "O"]),
+    (["bad", "service"], ["O", "B-negative"]),
+    (["great", "food", "and", "bad", "wine"], ["O", "B-positive", "O", "O", "B-negative"]),
+    (["good", "food", "good"], ["B-positive", "O", "O"]),
+    (["good", "wine"], ["O", "B-positive"]),
+    (["bad", "food", "good"], ["O", "B-negative", "O"]),
+]
+
+
+@pytest.fixture
+def data():
+    """``data("ES", "train")`` is the path of ``Data/ES/train``."""
+    return lambda *parts: os.path.join(DATA, *parts)
+
+
+@pytest.fixture
+def tagged():
+    return [(list(words), list(tags)) for words, tags in TAGGED]
+
+
+@pytest.fixture
+def small_counts(tagged):
+    """``small_counts(sentences=TAGGED)`` counts a few hand-tagged sentences."""
+    def make(sentences=tagged):
+        counts = HMMCounts()
+        counts.update(sentences)
+        return counts
+    return make
+
+
+@pytest.fixture
+def small_model(small_counts):
+    """``small_model(**options)`` is ``HMMModel.from_counts`` over ``TAGGED``."""
+    return lambda **options: HMMModel.from_counts(small_counts(), **options)
@@ -0,0 +1,31 @@
+import pytest
+
+from hmm_tagger.cli import main
+from hmm_tagger.conll import read_sentences
+from hmm_tagger.lite import LiteModel
+from hmm_tagger.model import HMMModel
+from hmm_tagger.precision import PRECISIONS
+
+
+@pytest.mark.parametrize("language", ["ES", "RU"])
+def test_lite_model_decodes_like_hmm_model(language, data, tmp_path):
+    model = HMMModel.from_file(data(language, "train"))
+    sentences = list(read_sentences(data(language, "dev.in")))
+    for name in PRECISIONS:
+        path = str(tmp_path / f"{name}.hmm")
+        model.save(path, name)
+        assert LiteModel.load(path).decode_batch(sentences) == HMMModel.load(path).decode_batch(sentences), name
+
+
+def test_truncated_artifacts_are_rejected(small_model, tmp_path, capsys):
+    path = tmp_path / "model.hmm"
+    small_model().save(str(path))
+    content = path.read_bytes()
+    (tmp_path / "in").write_text("good food\n\n", encoding="utf-8")
+    for size in (len(content) - 1, len(content) // 2, 100, 12):
+        path.write_bytes(content[:size])
+        for load in (LiteModel.load, HMMModel.load):
+            with pytest.raises(ValueError, match="truncated"):
+                load(str(path))
+        assert main(["tag", str(path), str(tmp_path / "in"), "-o", str(tmp_path / "out")]) == 1
+        assert "truncated" in capsys.readouterr().err
@@ -0,0 +1,57 @@
+import numpy as np
+
+from hmm_tagger import instrument
+from hmm_tagger.cache import DecodeCache
+from hmm_tagger.conll import read_sentences
+from hmm_tagger.model import HMMModel
+
+
+def _key(*ids):
+    return DecodeCache.key(np.array(ids, dtype=np.int32))
+
+
+def test_least_recently_used_entries_go_first_within_the_byte_budget():
+    probe = DecodeCache()
+    probe.put(_key(0), (0, 0))
+    entry = probe.bytes
+    cache = DecodeCache(3 * entry)
+    for i in range(3):
+        cache.put(_key(i), (0, 0))
+    assert cache.get(_key(0)) == (0, 0)
+    cache.put(_key(3), (0, 0))
+    assert cache.get(_key(1)) is None
+    assert all(cache.get(_key(i)) is not None for i in (0, 2, 3))
+    assert cache.bytes == 3 * entry <= cache.max_bytes and cache.evictions == 1
+    # An entry larger than the whole budget is not stored
+    cache.put(_key(4), tuple(range(3 * entry)))
+    assert len(cache) == 3 and cache.get(_key(4)) is None
+
+
+def test_binding_another_model_version_empties_the_cache():
+    cache = DecodeCache()
+    cache.bind("a")
+    cache.put(_key(1), (0,))
+    cache.bind("a")
+    assert len(cache) == 1 and cache.invalidations == 0
+    cache.bind("b")
+    assert len(cache) == 0 and cache.bytes == 0 and cache.invalidations == 1
+
+
+def test_cache_hits_are_still_counted_as_decoded_sentences(data):
+    model = HMMModel.from_file(data("ES", "train")).use_cache(DecodeCache())
+    sentences = list(read_sentences(data("ES", "dev.in")))
+    with instrument.collecting() as cold:
+        model.decode_batch(sentences)
+    with instrument.collecting() as warm:
+        model.decode_batch(sentences)
+    assert cold.counters["sentences"] == len(sentences) and cold.counters["oov_tokens"] > 0
+    for name in ("sentences", "tokens", "oov_tokens"):
+        assert warm.counters[name] == cold.counters[name]
+    assert warm.counters["lattice_cells"] == 0 and warm.counters["cache_hits"] == len(sentences)
+    with instrument.collecting() as stats:
+        for words in sentences[:5]:
+            model.decode(words)
+            model.k_best(words, 2)
+            model.k_best(words, 2)
+    assert stats.counters["sentences"] == 15
+    assert stats.counters["tokens"] == 3 * sum(map(len, sentences[:5]))
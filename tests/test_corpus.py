@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from hmm_tagger.corpus import Corpus
+from hmm_tagger.counts import HMMCounts, read_tagged_file
+
+
+@pytest.mark.parametrize("language", ["ES", "RU"])
+def test_cached_corpus_counts_match_the_text_file(language, data, tmp_path):
+    train = data(language, "train")
+    expected = HMMCounts.from_sequences(*read_tagged_file(train))
+    Corpus.from_file(train).save(str(tmp_path / "train.corpus"))
+    counts = HMMCounts.from_corpus(Corpus.load(str(tmp_path / "train.corpus")))
+    assert counts.tags == expected.tags
+    assert counts.words == expected.words
+    for name in ("emission_counts", "transition_counts", "start_counts", "stop_counts"):
+        assert np.array_equal(getattr(counts, name), getattr(expected, name)), name
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from hmm_tagger.counts import HMMCounts, count_files
+from hmm_tagger.model import HMMModel
+
+
+def test_earlier_tables_survive_later_updates(tagged, small_counts):
+    counts = small_counts()
+    emissions, unk = counts.emission_probabilities(1)
+    transitions = counts.transition_probabilities()
+    kept_emissions, kept_transitions = emissions.copy(), transitions.copy()
+    counts.subtract(small_counts(tagged[1:]))
+    counts.update([(["food", "food"], ["B-positive", "B-positive"])])
+    new_emissions, _ = counts.emission_probabilities(1)
+    new_transitions = counts.transition_probabilities()
+    np.testing.assert_array_equal(emissions, kept_emissions)
+    np.testing.assert_array_equal(transitions, kept_transitions)
+    assert not np.array_equal(new_emissions[:len(emissions)], emissions)
+    assert not np.array_equal(new_transitions, transitions)
+
+
+def test_transitions_only_subtract_cannot_go_negative():
+    counts = HMMCounts.from_sequences(None, ["O", "O", "B-positive"], [3])
+    other = HMMCounts.from_sequences(None, ["O", "B-positive", "O"], [3])
+    with pytest.raises(ValueError):
+        counts.subtract(other)
+    assert (counts.transition_matrix() >= 0).all()
+
+
+def test_merged_shards_are_bit_identical_to_one_pass(data, tmp_path):
+    train = data("RU", "train")
+    with open(train, encoding="utf-8") as file:
+        blocks = [block + "\n\n" for block in file.read().strip("\n").split("\n\n")]
+    paths = []
+    for shard in range(4):
+        paths.append(str(tmp_path / f"shard{shard}"))
+        with open(paths[-1], "w", encoding="utf-8") as file:
+            file.writelines(blocks[shard * len(blocks) // 4:(shard + 1) * len(blocks) // 4])
+    single = HMMCounts.from_file(train)
+    for merged in (count_files(paths, workers=2), count_files(paths, workers=1)):
+        assert merged.tags == single.tags
+        assert merged.words == single.words
+        for name in ("emission_counts", "transition_counts", "start_counts", "stop_counts"):
+            assert np.array_equal(getattr(merged, name), getattr(single, name)), name
+        merged_model, single_model = HMMModel.from_counts(merged), HMMModel.from_counts(single)
+        assert merged_model.log_transition.tobytes() == single_model.log_transition.tobytes()
+        assert merged_model.emissions.data.tobytes() == single_model.emissions.data.tobytes()
@@ -0,0 +1,38 @@
+import numpy as np
+
+from hmm_tagger.em import baum_welch
+from hmm_tagger.model import FLOOR, HMMModel, safe_log
+from hmm_tagger.posterior import ExpectedCounts
+
+UNTAGGED = [["the", "wine", "was", "bad"], ["great", "service"], ["food", "food", "and", "music"]]
+
+
+def test_one_iteration_matches_hand_m_step(small_counts, tmp_path):
+    counts = small_counts()
+    shard = tmp_path / "shard.in"
+    shard.write_text("\n".join("\n".join(words) + "\n" for words in UNTAGGED), encoding="utf-8")
+
+    model, _ = next(baum_welch(counts, [str(shard)], iterations=1, workers=1, weight=1.0))
+
+    initial = HMMModel.from_counts(counts)
+    expected = ExpectedCounts(initial.log_transition, [initial.emission_slice(words) for words in UNTAGGED])
+    num_tags = counts.num_tags
+    table = counts.transition_matrix().astype(float)
+    table[:num_tags, :num_tags] += expected.transitions
+    table[num_tags, :num_tags] += expected.start
+    table[:num_tags, num_tags + 1] += expected.stop
+    totals = table.sum(axis=1, keepdims=True)
+    probabilities = np.divide(table, totals, out=np.zeros(table.shape), where=totals > 0)
+
+    assert model.tags == initial.tags
+    np.testing.assert_allclose(model.log_transition, safe_log(probabilities, FLOOR), rtol=1e-12)
+
+
+def test_float_counts_keep_fractional_transitions(small_counts):
+    counts = small_counts().copy(float)
+    counts.transition_counts += 0.5
+    counts.start_counts += 0.25
+    table = counts.transition_matrix()
+    num_tags = counts.num_tags
+    np.testing.assert_array_equal(table[:num_tags, :num_tags], counts.transition_counts)
+    np.testing.assert_array_equal(table[num_tags, :num_tags], counts.start_counts)
@@ -0,0 +1,33 @@
+import pytest
+
+from hmm_tagger.evaluate import entities, score, score_many
+
+
+def test_entities():
+    # An I- after O opens an entity
+    assert entities(["O", "I-positive", "I-positive", "O"]) == {(1, 3, "positive")}
+    # A type change inside a span starts a new entity
+    assert entities(["B-positive", "I-negative", "I-negative"]) == {(0, 1, "positive"), (1, 3, "negative")}
+    assert entities(["B-positive", "B-positive", "I-positive"]) == {(0, 1, "positive"), (1, 3, "positive")}
+    # An entity running to the end of the sentence
+    assert entities(["O", "O", "B-negative"]) == {(2, 3, "negative")}
+    assert entities(["O", "O"]) == set()
+
+
+def test_span_and_type_are_counted_separately():
+    gold = [["B-positive", "I-positive", "O", "B-negative"], ["O", "B-neutral"]]
+    predicted = [["B-negative", "I-negative", "O", "B-negative"], ["B-neutral", "O"]]
+    result = score(gold, predicted)
+    assert (result.gold, result.predicted) == (3, 3)
+    assert (result.correct_entity, result.correct_sentiment) == (2, 1)
+    assert result.entity == pytest.approx((2 / 3, 2 / 3, 2 / 3))
+    assert result.sentiment == pytest.approx((1 / 3, 1 / 3, 1 / 3))
+
+
+def test_streams_must_have_as_many_sentences_as_the_gold_data():
+    with pytest.raises(ValueError, match="more sentences"):
+        score([["O"]], [["O"], ["B-positive"]])
+    with pytest.raises(ValueError, match="fewer sentences"):
+        score([["O"], ["O"]], [["O"]])
+    with pytest.raises(ValueError, match="'long'"):
+        score_many([["O"]], {"ok": [["O"]], "long": [["O"], ["O"]]})
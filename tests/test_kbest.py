@@ -0,0 +1,45 @@
+import itertools
+import numpy as np
+import pytest
+
+import Task3
+from hmm_tagger.conll import read_sentences
+from hmm_tagger.model import HMMModel
+
+
+def _brute_force(model, words):
+    """Every possible (log score, tag ids) path of a sentence, best first."""
+    transition = model.log_transition
+    emission = model.emission_slice(words)
+    start, stop = model.num_tags, model.num_tags + 1
+    scored = []
+    for path in itertools.product(range(model.num_tags), repeat=len(words)):
+        states = (start,) + path + (stop,)
+        score = sum(transition[u, v] for u, v in zip(states, states[1:]))
+        score += sum(emission[w, t] for w, t in enumerate(path))
+        if score > -np.inf:
+            scored.append((score, list(path)))
+    scored.sort(key=lambda item: -item[0])
+    return scored
+
+
+@pytest.mark.parametrize("language", ["ES", "RU"])
+def test_k_best_matches_brute_force(language, data):
+    model = HMMModel.from_file(data(language, "train"))
+    tag_index = {tag: i for i, tag in enumerate(model.tags)}
+    sentences = [words for words in read_sentences(data(language, "dev.in")) if len(words) <= 3][:10]
+    assert sentences
+    for words in sentences:
+        expected = _brute_force(model, words)
+        for k in (1, 2, 8):
+            ranked = Task3.k_viterbi(model, words, k)
+            assert len(ranked) == min(k, len(expected))
+            scores = [score for score, _ in ranked]
+            assert scores == sorted(scores, reverse=True)
+            np.testing.assert_allclose(scores, [score for score, _ in expected[:k]], rtol=1e-12)
+            # Paths may swap within exact ties, but each one must be a distinct path with its own score
+            by_path = {tuple(path): score for score, path in expected}
+            paths = [tuple(tag_index[tag] for tag in tags) for _, tags in ranked]
+            assert len(set(paths)) == len(paths)
+            for score, path in zip(scores, paths):
+                assert by_path[path] == pytest.approx(score, rel=1e-12)
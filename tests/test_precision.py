@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from hmm_tagger.conll import read_sentences
+from hmm_tagger.model import HMMModel
+from hmm_tagger.precision import PRECISIONS, get_precision
+from hmm_tagger.viterbi import viterbi
+
+
+def test_int16_clips_finite_values_and_keeps_minus_infinity_apart():
+    precision = get_precision("int16")
+    stored = precision.quantize([0.0, -1.0, -32.0, -40.0, -1e9, -np.inf, 3e9])
+    assert stored.dtype == np.int16
+    assert stored.tolist() == [0, -1000, -32000, -32767, -32767, -32768, 32767]
+    restored = precision.dequantize(stored)
+    assert np.isneginf(restored[5]) and np.isfinite(restored[:5]).all()
+    np.testing.assert_allclose(restored[:3], [0.0, -1.0, -32.0])
+    widened = precision.widen(stored)
+    assert widened.dtype == np.int32 and widened[5] == precision.impossible
+    assert np.isneginf(precision.dequantize(widened)[5])
+
+
+@pytest.mark.parametrize("name", ["int16", "int32"])
+def test_impossible_paths_saturate_instead_of_overflowing(name):
+    precision = get_precision(name)
+    # Three impossible terms per step still fit in the accumulator
+    assert 3 * precision.impossible > np.iinfo(precision.accumulator).min
+    transition = precision.widen(precision.quantize(np.log(np.full((4, 4), 0.5))))
+    # One possible path in a long sentence of otherwise impossible tags
+    with np.errstate(divide="ignore"):
+        emission = precision.widen(precision.quantize(np.log([[0.0, 1.0], [1.0, 0.0], [1.0, 0.0]] * 40)))
+    path = viterbi(transition, emission, precision.saturate)
+    assert path == [1, 0, 0] * 40
+
+
+@pytest.mark.parametrize("language", ["ES", "RU"])
+def test_every_precision_decodes_dev_to_the_float64_paths(language, data):
+    model = HMMModel.from_file(data(language, "train"))
+    sentences = list(read_sentences(data(language, "dev.in")))
+    reference = model.decode_batch(sentences)
+    for name in PRECISIONS:
+        assert model.with_precision(name).decode_batch(sentences) == reference, name
+
+
+@pytest.mark.parametrize("name", ["int16", "int32"])
+def test_quantized_k_best_scores_are_within_rounding_of_float64(name, data):
+    model = HMMModel.from_file(data("ES", "train"))
+    quantized = model.with_precision(name)
+    scale = quantized.precision.scale
+    for words in list(read_sentences(data("ES", "dev.in")))[:100]:
+        expected = [score for score, _ in model.k_best(words, 4)]
+        actual = [score for score, _ in quantized.k_best(words, 4)]
+        # A path sums n emissions and n + 1 transitions, each within 1 / (2 * scale)
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=(2 * len(words) + 1) / (2 * scale))
+
+
+def test_load_or_train_retrains_a_model_saved_with_other_options(data, tmp_path):
+    train, path = data("ES", "train"), str(tmp_path / "train.hmm")
+    HMMModel.from_file(train, unk="total").save(path, "int16")
+    assert HMMModel.load_or_train(train, path).precision.name == "float64"
+    loaded = HMMModel.load(path)
+    assert loaded.precision.name == "float64" and "unk" not in loaded.meta
+    model = HMMModel.load_or_train(train, path, unk="total", precision="int16")
+    assert model.precision.name == "int16" and model.meta["unk"] == "total"
+    # Up to date and trained with the same options: loaded, not retrained
+    stamp = (tmp_path / "train.hmm").stat().st_mtime_ns
+    assert HMMModel.load_or_train(train, path, unk="total", precision="int16").precision.name == "int16"
+    assert (tmp_path / "train.hmm").stat().st_mtime_ns == stamp
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from hmm_tagger import instrument
+from hmm_tagger.conll import read_sentences
+from hmm_tagger.model import HMMModel
+
+
+def _expected_dictionary(counts, min_share):
+    shares = counts.emission_counts / counts.emission_counts.sum(axis=1, keepdims=True)
+    # A word always keeps its most frequent tags
+    threshold = np.minimum(min_share, shares.max(axis=1, keepdims=True))
+    return [sorted(np.flatnonzero((counts.emission_counts[i] > 0) & (shares[i] >= threshold[i])).tolist())
+            for i in range(counts.num_words)]
+
+
+@pytest.mark.parametrize("unk", ["tag", "total"])
+@pytest.mark.parametrize("min_share", [0.2, 0.4, 0.7])
+def test_min_share_uses_word_tag_shares(unk, min_share, small_counts, tmp_path):
+    counts = small_counts()
+    model = HMMModel.from_counts(counts, k=1, unk=unk)
+    model.save(str(tmp_path / "model.hmm"))
+    for candidate in (model, HMMModel.load(str(tmp_path / "model.hmm"))):
+        indptr, tags, _ = candidate.tag_dictionary(min_share)
+        words = [sorted(tags[indptr[i]:indptr[i + 1]]) for i in range(counts.num_words)]
+        assert words == _expected_dictionary(counts, min_share)
+        assert len(candidate.decode_pruned(["food", "good"], min_share=min_share)) == 2
+
+
+def test_pruned_decoders_count_the_cells_they_score(small_model):
+    model = small_model(k=1)
+    words = ["good", "food", "unseen", "wine", "good", "food"]
+    indptr, _, _ = model.tag_dictionary(0.0)
+    sizes = [indptr[i + 1] - indptr[i] for i in model.word_ids(words).tolist()]
+    expected = sum(a * b for a, b in zip(sizes, sizes[1:]))
+    assert expected < (len(words) - 1) * len(model.tags) ** 2
+    with instrument.collecting() as stats:
+        model.decode_pruned(words)
+    assert stats.counters["lattice_cells"] == expected
+    with instrument.collecting() as stats:
+        model.decode_segmented(words)
+        first = stats.counters["lattice_cells"]
+        model.decode_segmented(words)
+    assert 0 < first <= expected
+    assert stats.counters["lattice_cells"] == first
+
+
+@pytest.mark.parametrize("language", ["ES", "RU"])
+@pytest.mark.parametrize("min_share", [0.0, 0.05, 0.3])
+def test_segmented_decoding_equals_constrained_viterbi(language, min_share, data):
+    model = HMMModel.from_file(data(language, "train"))
+    sentences = list(read_sentences(data(language, "dev.in")))
+    # The second pass answers repeated spans from the memo
+    for _ in range(2):
+        for words in sentences:
+            assert model.decode_segmented(words, min_share) == model.decode_pruned(words, min_share=min_share)
+    if min_share == 0.0:
+        assert [model.decode_pruned(words) for words in sentences] == model.decode_batch(sentences)
@@ -0,0 +1,31 @@
+from hmm_tagger.conll import read_sentences
+from hmm_tagger.model import HMMModel
+from hmm_tagger.registry import ModelRegistry
+
+SENTENCES = [["Muy", "bueno"], ["La", "comida", "estaba", "fría"], ["Muy", "bueno"]]
+
+
+def test_reload_gives_the_new_model_its_own_cache(data, tmp_path):
+    train = data("ES", "train")
+    HMMModel.from_file(train).save(str(tmp_path / "ES.hmm"))
+    registry = ModelRegistry(str(tmp_path), cache_bytes=1 << 20)
+    old = registry["ES"]
+    old.decode_batch(SENTENCES)
+
+    # Same parameters: the cached paths are carried over in a separate cache
+    HMMModel.from_file(train).save(str(tmp_path / "ES.hmm"))
+    same = registry["ES"]
+    assert same is not old and same.cache is not old.cache
+    assert len(same.cache) == len(old.cache) > 0
+
+    # New parameters: an empty cache, and decodes still running on the old model
+    # cannot write into it
+    retrained = HMMModel.from_file(train, k=5)
+    retrained.save(str(tmp_path / "ES.hmm"))
+    new = registry["ES"]
+    assert new.meta["k"] == 5 and new.cache is not same.cache and len(new.cache) == 0
+    old.decode_batch([["otra", "frase"]])
+    same.decode_batch([["otra", "frase"]])
+    assert len(new.cache) == 0
+    dev = list(read_sentences(data("ES", "dev.in")))[:50]
+    assert new.decode_batch(dev) == retrained.decode_batch(dev)
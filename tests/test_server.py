@@ -0,0 +1,42 @@
+import asyncio
+
+from hmm_tagger.client import ServiceError, TagClient
+from hmm_tagger.server import TaggingServer
+
+def _run(models, requests, max_k=4):
+    async def main():
+        server = TaggingServer(models, max_latency=0.001, max_k=max_k)
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        results = []
+        try:
+            async with TagClient("127.0.0.1", port) as client:
+                for language, sentences, k in requests:
+                    try:
+                        results.append(await client.tag(language, sentences, k))
+                    except ServiceError as error:
+                        results.append(error.status)
+        finally:
+            server.close()
+            listener.close()
+        return results
+
+    return asyncio.run(main())
+
+
+def test_k_above_the_limit_is_rejected(small_model):
+    results = _run({"ES": small_model()}, [("ES", ["otra cosa"], 4), ("ES", ["otra cosa"], 10 ** 8)])
+    assert len(results[0][0]) == 4
+    assert results[1] == 400
+
+
+def test_decode_errors_get_a_500_reply(small_model):
+    model = small_model()
+
+    def broken(sentences):
+        raise ValueError("decoder failed")
+
+    model.decode_batch = broken
+    failed, ranked = _run({"ES": model}, [("ES", ["good food"], None), ("ES", ["good food"], 2)])
+    # The connection survives the error and serves the next request
+    assert failed == 500 and len(ranked) == 1
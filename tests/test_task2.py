@@ -0,0 +1,44 @@
+import Task2
+from hmm_tagger.conll import read_sentences, read_tagged_sentences
+
+
+# The per-pair rescans Task2.py used before the count tables, kept as the reference
+def _transition(tags):
+    tags = ["START"] + tags + ["STOP"]
+    parameters = {}
+    for u, v in zip(tags, tags[1:]):
+        if (u, v) not in parameters:
+            count_u = sum(1 for i in range(len(tags) - 1) if tags[i] == u)
+            count_u_to_v = sum(1 for i in range(len(tags) - 1) if tags[i] == u and tags[i + 1] == v)
+            parameters[u, v] = count_u_to_v / count_u
+    return parameters
+
+
+def _emission(tags, train_words, test_words, k=1):
+    parameters = {}
+    for x in sorted(set(test_words)):
+        parameters[x] = {}
+        for y in sorted(set(tags)):
+            count_y = tags.count(y)
+            if x in train_words:
+                count_y_to_x = sum(1 for word, tag in zip(train_words, tags) if word == x and tag == y)
+                parameters[x][y] = count_y_to_x / (count_y + k)
+            else:
+                parameters[x][y] = k / (count_y + k)
+    return parameters
+
+
+def test_parameters_are_identical_to_the_rescans(data):
+    sentences = list(read_tagged_sentences(data("ES", "train")))[:150]
+    words = [word for sentence, _ in sentences for word in sentence]
+    tags = [tag for _, sentence in sentences for tag in sentence]
+    test_words = [word for sentence in list(read_sentences(data("ES", "dev.in")))[:50]
+                  for word in sentence]
+    expected_transition = _transition(tags)
+    transition = Task2.transition(tags)
+    assert list(transition.items()) == list(expected_transition.items())
+    expected_emission = _emission(tags, words, test_words)
+    emission = Task2.emission(tags, words, test_words)
+    assert list(emission) == list(expected_emission)
+    for word, row in expected_emission.items():
+        assert list(emission[word].items()) == list(row.items())
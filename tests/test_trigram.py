@@ -0,0 +1,53 @@
+import itertools
+import numpy as np
+
+from hmm_tagger import instrument
+from hmm_tagger.conll import read_sentences
+from hmm_tagger.model import HMMModel
+from hmm_tagger.trigram import TrigramModel
+
+
+def _path_score(model, words, tags):
+    """Log-probability of a tag id sequence, summed edge by edge."""
+    pair_of = {tuple(pair): i for i, pair in enumerate(model.pairs.tolist())}
+    edges = {(s, t): e for s, t, e in zip(model.sources.tolist(), model.targets.tolist(),
+                                          model.edge_scores.tolist())}
+    emission = model.emissions.dense(model.vocab.lookup(words, model.emissions.unk_id))
+    states = [pair_of.get(pair) for pair in zip([model.num_tags] + list(tags[:-1]), tags)]
+    if None in states:
+        return -np.inf
+    total = model.start_scores[states[0]] + model.stop_scores[states[-1]]
+    for previous, state in zip(states, states[1:]):
+        if (previous, state) not in edges:
+            return -np.inf
+        total += edges[previous, state]
+    return total + sum(emission[w, tag] for w, tag in enumerate(tags))
+
+
+def test_decode_matches_brute_force_and_survives_save(data, tmp_path):
+    model = TrigramModel.from_file(data("ES", "train"))
+    model.save(str(tmp_path / "trigram.hmm"))
+    loaded = TrigramModel.load(str(tmp_path / "trigram.hmm"))
+    tag_index = {tag: i for i, tag in enumerate(model.tags)}
+    sentences = [words for words in read_sentences(data("ES", "dev.in")) if len(words) <= 4][:15]
+    assert sentences
+    for words in sentences:
+        decoded = model.decode(words)
+        assert loaded.decode(words) == decoded
+        best = max(_path_score(model, words, tags)
+                   for tags in itertools.product(range(model.num_tags), repeat=len(words)))
+        assert np.isclose(_path_score(model, words, [tag_index[tag] for tag in decoded]), best)
+
+
+def test_every_dev_sentence_gets_a_finite_best_score(data):
+    model = TrigramModel.from_file(data("RU", "train"))
+    bigram = HMMModel.from_file(data("RU", "train"))
+    tag_index = {tag: i for i, tag in enumerate(model.tags)}
+    with instrument.collecting() as stats:
+        for words in read_sentences(data("RU", "dev.in")):
+            best, tags = model.decode_scored(words)
+            assert np.isfinite(best)
+            trigram_score = _path_score(model, words, [tag_index[tag] for tag in tags])
+            # Either the second-order path with its own score, or the first-order fallback
+            assert np.isclose(trigram_score, best) or (trigram_score == -np.inf and tags == bigram.decode(words))
+    assert stats.counters["first_order_fallbacks"] > 0
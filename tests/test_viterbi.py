@@ -0,0 +1,15 @@
+import numpy as np
+import pytest
+
+from hmm_tagger import viterbi as viterbi_module
+from hmm_tagger.viterbi import viterbi, viterbi_batch
+
+
+@pytest.mark.parametrize("num_tags", [3, 31, 100])
+@pytest.mark.parametrize("cells", [1, 1000, viterbi_module.BATCH_CELLS])
+def test_batches_sized_by_the_cell_budget_match_single_decoding(num_tags, cells, monkeypatch):
+    monkeypatch.setattr(viterbi_module, "BATCH_CELLS", cells)
+    rng = np.random.default_rng(num_tags)
+    log_transition = np.log(rng.dirichlet(np.ones(num_tags + 2), size=num_tags + 2))
+    emissions = [np.log(rng.dirichlet(np.ones(num_tags), size=n)) for n in rng.integers(0, 12, size=40)]
+    assert viterbi_batch(log_transition, emissions) == [viterbi(log_transition, e) for e in emissions]